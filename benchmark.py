@@ -0,0 +1,357 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import numpy as np
+import networkx as nx
+
+from datetime import datetime
+from timeit import default_timer as timer
+from epidemic.aggregate import summary_table
+from epidemic.batch import simulate_batch
+from epidemic.coupled import simulate_coupled
+from epidemic.csr import CSRGraph, CSRSI
+from epidemic.distances import hop_distances
+from epidemic.epidemic import SI
+from epidemic.events import EventSI
+from epidemic.percolation import simulate_percolation
+from epidemic.reachability import ReachabilityIndex
+from epidemic.rng import stream
+from epidemic.store import ResultsStore, load_results
+from imports.departments import DEPARTMENTS, Department
+
+ENGINES = ["networkx", "csr", "events", "batch", "percolation", "coupled"]
+RANDOM_JUMP_ENGINES = ["networkx", "csr", "events"]
+# Engines that do not scale to the largest synthetic networks: networkx
+# holds a Python object per edge, and percolation a closure of
+# n_components**2 bits per trial. Random jumps need such a closure too
+# (the graph's ReachabilityIndex, about 1.25 GB at 100000 nodes), so no
+# engine runs them on the largest networks either.
+LIMITED_ENGINES = ["networkx", "percolation"]
+
+# The figures of getplots.py, with the arguments its main block uses
+FIGURES = [("plot_centrality", lambda getplots: ()),
+           ("plot_grouped_adjacency", lambda getplots: ()),
+           ("plot_si_prestige_size", lambda getplots: (getplots.all_departments_SI[1],)),
+           ("plot_si_prestige_length", lambda getplots: (getplots.all_departments_SI[1],)),
+           ("plot_random_hop_size", lambda getplots: (getplots.all_departments_SI_random_jump[1],)),
+           ("plot_size_infection_probability", lambda getplots: (getplots.all_departments_SI[1],))]
+
+
+def process_peak_rss_mb():
+    """Peak resident set size of this process so far, in megabytes.
+
+    The peak never goes down, so a phase's value covers every phase run
+    before it too; only a rise over the previous phase's can be put down
+    to the phase itself.
+
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, and in kilobytes elsewhere
+    return peak / 2.0**20 if sys.platform == "darwin" else peak / 2.0**10
+
+
+def synthetic_hiring_graph(n_nodes, n_groups=10, mean_degree=20, decay=0.2, seed=0):
+    """A stochastic block model shaped like a faculty hiring network.
+
+    Nodes 0..n_nodes-1 are ranked by prestige and split into n_groups
+    blocks. More prestigious nodes place more graduates, and a hire from
+    block a goes to block b >= a (down the hierarchy) with weight 1, or up
+    to block b < a with weight decay**(a - b).
+
+    Returns
+    -------
+    A `CSRGraph` with about n_nodes * mean_degree edges.
+
+    """
+    rng = stream(seed, "synthetic", n_nodes)
+    n_edges = n_nodes * mean_degree
+    placement = np.exp(-2.0 * np.arange(n_nodes) / n_nodes)
+    sources = rng.choice(n_nodes, n_edges, p=placement / placement.sum())
+
+    starts = np.arange(n_groups + 1) * n_nodes // n_groups
+    groups = np.arange(n_groups)
+    blocks = np.where(groups[np.newaxis, :] >= groups[:, np.newaxis], 1.0,
+                      decay ** (groups[:, np.newaxis] - groups[np.newaxis, :]))
+    blocks /= blocks.sum(axis=1)[:, np.newaxis]
+
+    source_groups = sources * n_groups // n_nodes
+    cumulative = np.cumsum(blocks, axis=1)[source_groups]
+    target_groups = (rng.random(n_edges)[:, np.newaxis] > cumulative).sum(axis=1)
+    target_groups = np.minimum(target_groups, n_groups - 1)
+    sizes = starts[target_groups + 1] - starts[target_groups]
+    targets = starts[target_groups] + (rng.random(n_edges) * sizes).astype(np.int64)
+    return CSRGraph.from_edges(sources, targets, nodes=list(range(n_nodes)))
+
+
+def networkx_graph_of(graph):
+    """The MultiDiGraph of a `CSRGraph`, for the networkx engine."""
+    nx_graph = nx.MultiDiGraph()
+    nx_graph.add_nodes_from(graph.nodes)
+    sources = np.repeat(np.arange(graph.number_of_nodes()), np.diff(graph.indptr))
+    nx_graph.add_edges_from((graph.nodes[u], graph.nodes[v], {"weight": w}) for (u, v, w)
+                            in zip(sources.tolist(), graph.indices.tolist(), graph.weights.tolist()))
+    return nx_graph
+
+
+class Benchmark(object):
+    """Times phases and collects one record per phase.
+
+    Parameters
+    ----------
+    seed : root seed of every random stream the benchmark uses
+
+    limit : largest network to run the `LIMITED_ENGINES`, and random
+        jumps, on
+
+    """
+    def __init__(self, seed=0, limit=10000):
+        self.seed = seed
+        self.limit = limit
+        self.records = []
+
+    def time(self, graph, phase, run, **fields):
+        """Time `run()`. If it returns a dict, its counts, such as
+        "epidemics" and "edges", are recorded and turned into rates.
+
+        """
+        record = {"graph": graph, "phase": phase}
+        record.update(fields)
+        start = timer()
+        try:
+            counts = run()
+        except Exception as e:
+            record.update({"error": "{0}: {1}".format(type(e).__name__, e),
+                           "process_peak_rss_mb": process_peak_rss_mb()})
+            self.records.append(record)
+            print("{0:>14} {1:<32} failed ({2})".format(graph, phase, record["error"]))
+            return record
+        seconds = timer() - start
+
+        if isinstance(counts, dict):
+            record.update(counts)
+        record["seconds"] = seconds
+        for count in ("epidemics", "edges"):
+            if record.get(count) is not None:
+                record[count + "_per_sec"] = record[count] / seconds if seconds > 0 else None
+        record["process_peak_rss_mb"] = process_peak_rss_mb()
+        self.records.append(record)
+        print("{0:>14} {1:<32} {2:9.3f}s {3}".format(
+            graph, phase, seconds,
+            "" if record.get("epidemics_per_sec") is None else
+            "{0:12.1f} epidemics/s".format(record["epidemics_per_sec"])))
+        return record
+
+    def epidemics(self, name, graph, nx_graph, sources, p, engines, random_jump_p=None):
+        """Time each engine on one epidemic from each source."""
+        out_degree = np.diff(graph.indptr)
+        is_random_jump = random_jump_p is not None
+        suffix = "" if not is_random_jump else " (random jump)"
+        jump_kwargs = {} if not is_random_jump else \
+            {"is_random_jump": True, "random_jump_p": random_jump_p}
+
+        def run_networkx():
+            epi = SI(nx_graph, p=p, **jump_kwargs)
+            edges = 0
+            for source in sources:
+                epi.reset(rng=stream(self.seed, name, p, source))
+                epi.infect_node(source)
+                epi.simulate()
+                edges += out_degree[[graph.index[u] for u in epi.infected]].sum()
+            return {"epidemics": len(sources), "edges": int(edges)}
+
+        def run_compiled(model=CSRSI):
+            epi = model(graph, p=p, **jump_kwargs)
+            edges = 0
+            for source in sources:
+                epi.reset(rng=stream(self.seed, name, p, source))
+                epi.infect_node(source)
+                epi.simulate()
+                edges += out_degree[epi.infected].sum()
+            return {"epidemics": len(sources), "edges": int(edges)}
+
+        def run_batch():
+            simulate_batch(graph, sources, [p], 1, rng=stream(self.seed, name, p))
+            return {"epidemics": len(sources), "edges": None}
+
+        def run_percolation():
+            # One percolated graph gives an epidemic from every source
+            simulate_percolation(graph, sources, [p], 1, rng=stream(self.seed, name, p))
+            return {"epidemics": len(sources), "edges": graph.number_of_edges()}
+
+        def run_coupled():
+            simulate_coupled(graph, sources, [p], 1, rng=stream(self.seed, name, p))
+            return {"epidemics": len(sources), "edges": None}
+
+        runs = {"networkx": run_networkx, "csr": run_compiled,
+                "events": lambda: run_compiled(EventSI), "batch": run_batch,
+                "percolation": run_percolation, "coupled": run_coupled}
+        too_large = graph.number_of_nodes() > self.limit
+        engines = [engine for engine in engines
+                   if not (engine == "networkx" and nx_graph is None) and
+                   not ((engine in LIMITED_ENGINES or is_random_jump) and too_large)]
+        if is_random_jump and engines:
+            # Built in memory only, rather than saved to cache/graphs; the
+            # engines then find it by the graph's hash
+            self.time(name, "reachability index",
+                      lambda: ReachabilityIndex.of(graph, cache_dir=None),
+                      nodes=graph.number_of_nodes(), n_edges=graph.number_of_edges())
+        for engine in engines:
+            self.time(name, "simulate {0}{1}".format(engine, suffix), runs[engine],
+                      engine=engine, p=p, random_jump_p=random_jump_p,
+                      nodes=graph.number_of_nodes(), n_edges=graph.number_of_edges())
+
+    def department(self, department, args):
+        name = department.name
+        fresh = Department(department.name, department.title, department.other_node)
+        self.time(name, "import lists", lambda: fresh.metadata)
+        self.time(name, "import networkx graph", lambda: fresh.graph)
+        self.time(name, "import csr graph", lambda: fresh.csr)
+
+        graph = fresh.csr
+        nodes = list(fresh.metadata.keys())
+        rng = stream(self.seed, name, "sources")
+        sources = rng.choice(graph.nodes, min(args.epidemics, graph.number_of_nodes()),
+                             replace=False).tolist()
+        self.epidemics(name, graph, fresh.graph, sources, args.p, args.engines)
+        self.epidemics(name, graph, fresh.graph, sources, args.p,
+                       [e for e in args.engines if e in RANDOM_JUMP_ENGINES],
+                       random_jump_p=args.random_jump_p)
+        self.cache(name, nodes, args.cache_trials)
+
+    def cache(self, name, nodes, n_trials):
+        """Time writing and reading a store shaped like the department's
+        cache, filled with placeholder results.
+
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            ps = np.linspace(0, 1, 11)
+            rng = stream(self.seed, name, "cache")
+            results = {"size": {}, "length": {}}
+            for p in ps:
+                results["size"][p] = dict((node, rng.random(n_trials).tolist()) for node in nodes)
+                results["length"][p] = dict((node, rng.integers(1, 10, n_trials).tolist()) for node in nodes)
+            cache_dir = os.path.join(directory, "{0}_SI.p".format(name))
+            store = ResultsStore(os.path.join(directory, "{0}_SI".format(name)))
+            n_rows = len(ps) * len(nodes) * n_trials
+
+            self.time(name, "cache append", lambda: store.append(results), trials=n_rows)
+            self.time(name, "cache load (shards)", lambda: load_results(cache_dir), trials=n_rows)
+            self.time(name, "cache compact", store.compact, trials=n_rows)
+            self.time(name, "cache load (memory-mapped)",
+                      lambda: load_results(cache_dir).mean("size"), trials=n_rows)
+            self.time(name, "summary table (cold)", lambda: summary_table(cache_dir), trials=n_rows)
+            self.time(name, "summary table (memoized)", lambda: summary_table(cache_dir), trials=n_rows)
+        finally:
+            shutil.rmtree(directory)
+
+    def synthetic(self, n_nodes, args):
+        name = "sbm-{0}".format(n_nodes)
+        built = {}
+
+        def build():
+            built["graph"] = synthetic_hiring_graph(n_nodes, mean_degree=args.mean_degree, seed=self.seed)
+            return {"edges": built["graph"].number_of_edges()}
+        self.time(name, "generate csr graph", build)
+        graph = built["graph"]
+
+        nx_graph = None
+        if n_nodes <= self.limit and "networkx" in args.engines:
+            def convert():
+                built["nx_graph"] = networkx_graph_of(graph)
+            self.time(name, "build networkx graph", convert)
+            nx_graph = built.get("nx_graph")
+
+        rng = stream(self.seed, name, "sources")
+        sources = rng.choice(n_nodes, min(args.epidemics, n_nodes), replace=False).tolist()
+        self.epidemics(name, graph, nx_graph, sources, args.p, args.engines)
+        self.epidemics(name, graph, nx_graph, sources, args.p,
+                       [e for e in args.engines if e in RANDOM_JUMP_ENGINES],
+                       random_jump_p=args.random_jump_p)
+
+    def figures(self):
+        """Time every figure of getplots.py, which needs its own
+        dependencies (matplotlib, statsmodels, ...) and the caches."""
+        try:
+            import getplots
+        except Exception as e:
+            self.records.append({"graph": "getplots", "phase": "import",
+                                 "error": "{0}: {1}".format(type(e).__name__, e)})
+            print("{0:>14} {1:<32} skipped ({2})".format("getplots", "figures", self.records[-1]["error"]))
+            return
+        # Drawn into a scratch directory, leaving results/ and the tables
+        # next to the caches as they are
+        # The hop distances the figures normalize lengths by, computed in
+        # memory only, rather than saved to cache/graphs
+        for department in DEPARTMENTS.values():
+            self.time(department.name, "hop distances",
+                      lambda: hop_distances(department.graph, cache_dir=None))
+        directory = tempfile.mkdtemp()
+        try:
+            for name, arguments in FIGURES:
+                figure = getattr(getplots, name)
+                self.time("getplots", name,
+                          lambda: figure(*arguments(getplots), output_dir=directory))
+        finally:
+            shutil.rmtree(directory)
+
+
+def machine():
+    return {"platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": multiprocessing.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "networkx": nx.__version__}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the epidemic engines and plotting pipeline.")
+    parser.add_argument("--departments", nargs="*", default=sorted(DEPARTMENTS),
+                        help="bundled departments to benchmark")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[1000, 10000, 100000],
+                        help="node counts of the synthetic hiring networks")
+    parser.add_argument("--engines", nargs="*", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--epidemics", type=int, default=50,
+                        help="epidemics (sources) per engine and graph")
+    parser.add_argument("--p", type=float, default=0.1, help="transmission probability")
+    parser.add_argument("--random-jump-p", type=float, default=0.1, help="random jump probability")
+    parser.add_argument("--mean-degree", type=int, default=20,
+                        help="mean out-degree of the synthetic networks")
+    parser.add_argument("--limit", type=int, default=10000,
+                        help="largest network to run the networkx and percolation engines, "
+                             "and random jumps, on")
+    parser.add_argument("--cache-trials", type=int, default=100,
+                        help="trials per (p, node) in the cache benchmark")
+    parser.add_argument("--figures", action="store_true", help="also time the getplots.py figures")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write (default: benchmarks/<time>.json)")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(seed=args.seed, limit=args.limit)
+    for name in args.departments:
+        benchmark.department(DEPARTMENTS[name], args)
+    for n_nodes in args.sizes:
+        benchmark.synthetic(n_nodes, args)
+    if args.figures:
+        benchmark.figures()
+
+    created = datetime.utcnow()
+    output = args.output or os.path.join("benchmarks", created.strftime("%Y%m%dT%H%M%S") + ".json")
+    if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, "w") as f:
+        json.dump({"created": created.isoformat(), "machine": machine(),
+                   "arguments": vars(args), "results": benchmark.records}, f, indent=4)
+    print("Wrote {0}".format(output))
+
+
+if __name__ == "__main__":
+    main()
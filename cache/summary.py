@@ -1,4 +1,16 @@
-import pickle
+import os
+import sys
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+from epidemic.store import ResultsStore, store_path_of
+from imports.departments import department_of_path
+from imports.loader import read_vertices
+
+# The grid the update*results.py drivers run: every p (or jump
+# probability) of PS from every school of the department
+PS = np.linspace(0, 1, 11)
 
 DIR_CS_SI = "CS_SI.p"
 DIR_HIS_SI = "HIS_SI.p"
@@ -14,23 +26,61 @@ all_departments_SI = [("Business", DIR_BUSI_SI), ("Computer Science", DIR_CS_SI)
 all_departments_SI_random_jump = [("Business", DIR_BUSI_SI_JUMP_PROBABILITY), ("Computer Science", DIR_CS_SI_JUMP_PROBABILITY), ("History", DIR_HIS_SI_JUMP_PROBABILITY)]
 
 
+def nodes_of_dir(cache_dir):
+    """Every school of the department a cache path belongs to."""
+    department = department_of_path(cache_dir)
+    vertices = read_vertices(os.path.join(ROOT, "data", "{0}_vertexlist.txt".format(department.name)))
+    return vertices["u"].tolist()
+
+# Only the store's header is read, never the results themselves. Cells of
+# the grid that were never run count as having no trials.
+def coverage_of_dir(cache_dir, ps=PS, nodes=None):
+    header = ResultsStore(store_path_of(cache_dir)).header()
+    if header is None:
+        return None
+    if nodes is None:
+        nodes = nodes_of_dir(cache_dir)
+
+    p_index = dict((p, i) for i, p in enumerate(header["ps"]))
+    node_index = dict((node, j) for j, node in enumerate(header["nodes"]))
+    counts = np.zeros((len(ps), len(nodes)), dtype=np.int64)
+    for i, p in enumerate(ps):
+        for j, node in enumerate(nodes):
+            if float(p) in p_index and node in node_index:
+                counts[i, j] = header["counts"][p_index[float(p)], node_index[node]]
+    rows, columns = np.nonzero(counts == 0)
+    return {"min": int(counts.min()) if counts.size else 0,
+            "max": int(counts.max()) if counts.size else 0,
+            "by_p": [(p, int(row.min()), int(row.max())) for p, row in zip(ps, counts) if row.size],
+            "missing": [(ps[i], nodes[j]) for i, j in zip(rows, columns)],
+            "graph_hash": header["graph_hash"],
+            "updated": header["updated"]}
+
 def n_trials_of_dir(cache_dir):
-    cache = pickle.load(open(cache_dir, 'rb'))
-    try:
-        a_prob_key = cache["size"].iterkeys().next()
-        a_node_key = cache["size"][a_prob_key].iterkeys().next()
-        a_sizes_val = cache["size"][a_prob_key][a_node_key]
-        return len(a_sizes_val)
-    except:
+    coverage = coverage_of_dir(cache_dir)
+    if coverage is None:
         return 0
+    return coverage["min"]
+
+def print_coverage(title, cache_dir):
+    coverage = coverage_of_dir(cache_dir)
+    if coverage is None:
+        print("No results store\tTitle: {0}".format(title))
+        return
+    print("Number of trials: {0} to {1}\tMissing cells: {2}\tUpdated: {3}\tTitle: {4}".format(
+        coverage["min"], coverage["max"], len(coverage["missing"]), coverage["updated"], title))
+    for (p, fewest, most) in coverage["by_p"]:
+        print("    p = {0:.2f}: {1} to {2} trials".format(p, fewest, most))
+    for (p, node) in coverage["missing"]:
+        print("    missing: p = {0:.2f}, node {1}".format(p, node))
 
 if __name__ == "__main__":
 	# Returns how many trials there are for each epidemic with a particular transmission
 	# probability and starting from a particular node.
-    print ">>> SI"
+    print(">>> SI")
     for (title, cache_dir) in all_departments_SI:
-        print("Number of trials: {0}\tTitle: {1}".format(n_trials_of_dir(cache_dir), title))
+        print_coverage(title, cache_dir)
 
-    print ">>> SI + RANDOM HOP"
+    print(">>> SI + RANDOM HOP")
     for (title, cache_dir) in all_departments_SI_random_jump:
-        print("Number of trials: {0}\tTitle: {1}".format(n_trials_of_dir(cache_dir), title))
\ No newline at end of file
+        print_coverage(title, cache_dir)
@@ -0,0 +1,279 @@
+import os
+import numpy as np
+from datetime import datetime
+
+from epidemic.store import ResultsStore, arrays_of_results
+
+SUMMARY = "summary.npz"
+KINDS = ("size", "length")
+# Fixed histogram bins: sizes over [0, 1], and lengths one step wide, with
+# longer epidemics counted in the last bin. Every bin also sums its
+# values, so quantiles are exact as long as no bin holds two different
+# values, i.e. on graphs of up to SIZE_BINS nodes.
+SIZE_BINS = 512
+LENGTH_BINS = 256
+N_BINS = {"size": SIZE_BINS, "length": LENGTH_BINS}
+
+
+def bin_of(kind, values):
+    if kind == "size":
+        bins = np.floor(np.asarray(values, dtype=np.float64) * SIZE_BINS)
+    else:
+        bins = np.asarray(values, dtype=np.float64)
+    return np.clip(bins, 0, N_BINS[kind] - 1).astype(np.int64)
+
+
+class Accumulator(object):
+    """Running summary of the trials of every (p, node) cell.
+
+    For each of "size" and "length", keeps the count, mean and sum of
+    squared deviations (M2) of every cell, updated with Welford's method,
+    its minimum and maximum, and a histogram with fixed bins (see
+    `SIZE_BINS`) for the quantiles. The memory it takes depends on the
+    grid, not on the number of trials, and two accumulators of the same
+    runs merge exactly with `merge`, e.g. those of parallel workers.
+
+    The histograms dominate that memory: SIZE_BINS + LENGTH_BINS = 768
+    bins per cell, each an int32 count and a float64 sum, about 9 KB per
+    (p, node) cell. A department's grid of 11 p by 206 nodes takes 21 MB,
+    but a grid of 101 p by 10,000 nodes would take 9.3 GB; keep every
+    trial in a `ResultsStore` for grids that large.
+
+    Parameters
+    ----------
+    ps : transmission (or jump) probabilities
+
+    nodes : source node ids
+
+    """
+    def __init__(self, ps=(), nodes=()):
+        self.ps = [float(p) for p in ps]
+        self.nodes = [int(node) for node in nodes]
+        shape = (len(self.ps), len(self.nodes))
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.means = dict((kind, np.zeros(shape)) for kind in KINDS)
+        self.m2 = dict((kind, np.zeros(shape)) for kind in KINDS)
+        self.minima = dict((kind, np.full(shape, np.inf)) for kind in KINDS)
+        self.maxima = dict((kind, np.full(shape, -np.inf)) for kind in KINDS)
+        self.histograms = dict((kind, np.zeros(shape + (N_BINS[kind],), dtype=np.int32))
+                               for kind in KINDS)
+        self.bin_sums = dict((kind, np.zeros(shape + (N_BINS[kind],))) for kind in KINDS)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Summarize one row per trial (see `epidemic.store.arrays_of_results`)."""
+        accumulator = cls()
+        accumulator.add_arrays(arrays)
+        return accumulator
+
+    def _on_grid(self, ps, nodes):
+        """This accumulator on a grid covering `ps` and `nodes` as well as
+        its own (itself if it already does).
+
+        """
+        ps = sorted(set(self.ps) | set(float(p) for p in ps))
+        nodes = sorted(set(self.nodes) | set(int(node) for node in nodes))
+        if ps == self.ps and nodes == self.nodes:
+            return self
+        grown = Accumulator(ps, nodes)
+        cells = np.ix_(np.searchsorted(ps, self.ps), np.searchsorted(nodes, self.nodes))
+        grown.counts[cells] = self.counts
+        for kind in KINDS:
+            for name in ("means", "m2", "minima", "maxima", "histograms", "bin_sums"):
+                getattr(grown, name)[kind][cells] = getattr(self, name)[kind]
+        return grown
+
+    def _grow(self, ps, nodes):
+        self.__dict__.update(self._on_grid(ps, nodes).__dict__)
+
+    def add(self, results):
+        """Add trials, {"size": {p: {node: [...]}}, "length": ...}."""
+        self.add_arrays(arrays_of_results(results))
+
+    def add_arrays(self, arrays):
+        """Add one row per trial, with "p", "node", "size" and "length"."""
+        if len(arrays["p"]) == 0:
+            return
+        batch_ps, p_index = np.unique(arrays["p"], return_inverse=True)
+        batch_nodes, node_index = np.unique(arrays["node"], return_inverse=True)
+        self._grow(batch_ps.tolist(), batch_nodes.tolist())
+
+        # The batch's own cells, then merged into the grid's
+        rows = np.searchsorted(self.ps, batch_ps)[p_index]
+        columns = np.searchsorted(self.nodes, batch_nodes)[node_index]
+        cells = rows * len(self.nodes) + columns
+        n_cells = self.counts.size
+        counts = np.bincount(cells, minlength=n_cells).reshape(self.counts.shape)
+        for kind in KINDS:
+            values = np.asarray(arrays[kind], dtype=np.float64)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = np.bincount(cells, weights=values, minlength=n_cells) / counts.ravel()
+            deviations = values - means[cells]
+            m2 = np.bincount(cells, weights=deviations * deviations, minlength=n_cells)
+            self._merge_moments(kind, counts, means.reshape(counts.shape), m2.reshape(counts.shape))
+
+            minima = np.full(n_cells, np.inf)
+            np.minimum.at(minima, cells, values)
+            maxima = np.full(n_cells, -np.inf)
+            np.maximum.at(maxima, cells, values)
+            self.minima[kind] = np.minimum(self.minima[kind], minima.reshape(counts.shape))
+            self.maxima[kind] = np.maximum(self.maxima[kind], maxima.reshape(counts.shape))
+
+            # Only the bins the batch falls in are touched: a histogram-sized
+            # temporary would double the accumulator's memory
+            slots = cells * N_BINS[kind] + bin_of(kind, values)
+            np.add.at(self.histograms[kind].reshape(-1), slots, 1)
+            np.add.at(self.bin_sums[kind].reshape(-1), slots, values)
+        self.counts += counts
+
+    def _merge_moments(self, kind, counts, means, m2):
+        # Chan et al.'s pairwise update, which Welford's method is the
+        # one-trial case of
+        total = self.counts + counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = means - self.means[kind]
+            weight = np.where(total > 0, counts / total.astype(np.float64), 0.0)
+            self.means[kind] = np.where(counts > 0, self.means[kind] + delta * weight, self.means[kind])
+            self.m2[kind] = np.where(counts > 0, self.m2[kind] + m2 + delta * delta * self.counts * weight,
+                                     self.m2[kind])
+
+    def merge(self, other):
+        """Add the trials summarized by `other`, in place."""
+        self._grow(other.ps, other.nodes)
+        other = other._on_grid(self.ps, self.nodes)
+        for kind in KINDS:
+            self._merge_moments(kind, other.counts, other.means[kind], other.m2[kind])
+            self.minima[kind] = np.minimum(self.minima[kind], other.minima[kind])
+            self.maxima[kind] = np.maximum(self.maxima[kind], other.maxima[kind])
+            self.histograms[kind] += other.histograms[kind]
+            self.bin_sums[kind] += other.bin_sums[kind]
+        self.counts += other.counts
+        return self
+
+    def mean(self, kind):
+        """Average "size" or "length" of every (p, node) cell, NaN for cells
+        without trials, like `Results.mean`.
+
+        """
+        return np.where(self.counts > 0, self.means[kind], np.nan)
+
+    def std(self, kind):
+        """Sample standard deviation of every cell (NaN with fewer than two
+        trials).
+
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.counts > 1, np.sqrt(self.m2[kind] / (self.counts - 1)), np.nan)
+
+    def quantiles(self, kind, quantiles):
+        """The quantiles of every cell, an array of shape
+        (len(quantiles), n_p, n_nodes), interpolated between the trials like
+        `numpy.percentile`.
+
+        """
+        cumulative = np.cumsum(self.histograms[kind], axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            bin_values = self.bin_sums[kind] / self.histograms[kind]
+
+        def order_statistic(rank):
+            # The value of the rank-th smallest trial of every cell
+            bins = np.minimum((cumulative <= rank[:, :, np.newaxis]).sum(axis=2), N_BINS[kind] - 1)
+            return np.take_along_axis(bin_values, bins[:, :, np.newaxis], axis=2)[:, :, 0]
+
+        values = []
+        for q in quantiles:
+            h = q * np.maximum(self.counts - 1, 0)
+            low = order_statistic(np.floor(h))
+            high = order_statistic(np.ceil(h))
+            values.append(np.where(self.counts > 0, low + (h - np.floor(h)) * (high - low), np.nan))
+        return np.array(values).reshape((len(quantiles),) + self.counts.shape)
+
+    def save(self, f):
+        """Write to a file (or file object) as an .npz."""
+        arrays = {"ps": np.array(self.ps, dtype=np.float64),
+                  "nodes": np.array(self.nodes, dtype=np.int64),
+                  "counts": self.counts}
+        for kind in KINDS:
+            for name in ("means", "m2", "minima", "maxima", "histograms", "bin_sums"):
+                arrays["{0}_{1}".format(name, kind)] = getattr(self, name)[kind]
+        np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, f):
+        with np.load(f) as arrays:
+            accumulator = cls(arrays["ps"].tolist(), arrays["nodes"].tolist())
+            accumulator.counts = arrays["counts"]
+            for kind in KINDS:
+                for name in ("means", "m2", "minima", "maxima", "histograms", "bin_sums"):
+                    getattr(accumulator, name)[kind] = arrays["{0}_{1}".format(name, kind)]
+        return accumulator
+
+
+class SummaryStore(ResultsStore):
+    """A store that keeps an `Accumulator` of its runs instead of the runs.
+
+    A drop-in for `ResultsStore` in the update*results.py drivers, e.g.
+    `store=SummaryStore("cache/CS_SI")`: every appended batch is
+    summarized and merged into summary.npz, whose size does not grow with
+    the number of trials. The manifest keeps the same header (grid,
+    counts, graph hash, seeds and times of every batch), and
+    `epidemic.aggregate.summary_table` reads the summary straight from it.
+    The trials themselves are not kept, so `read` and `results` are not
+    available, and `compact` has nothing to do.
+
+    """
+    def _manifest(self):
+        manifest = ResultsStore._manifest(self)
+        manifest["kind"] = "summary"
+        return manifest
+
+    def append(self, results, seed=None, graph_hash=None):
+        """Summarize a batch of trials, {"size": {p: {node: [...]}}, ...},
+        into the store. Returns the number of trials added.
+
+        Parameters
+        ----------
+        seed, graph_hash : as for `ResultsStore.append`
+
+        """
+        arrays = arrays_of_results(results)
+        if len(arrays["p"]) == 0:
+            return 0
+        existing = ResultsStore(self.path)
+        if existing.exists() and existing.header()["kind"] != "summary":
+            raise ValueError("{0} holds every trial; use a ResultsStore.".format(self.path))
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        manifest = self._manifest()
+        if graph_hash is not None:
+            if manifest["graph_hash"] not in (None, graph_hash):
+                raise ValueError("{0} holds runs on graph {1}, not {2}.".format(
+                    self.path, manifest["graph_hash"], graph_hash))
+            manifest["graph_hash"] = graph_hash
+
+        accumulator = self.load().merge(Accumulator.from_arrays(arrays))
+        self._write_atomically(SUMMARY, accumulator.save)
+        now = datetime.utcnow().isoformat()
+        manifest["ps"], manifest["nodes"] = accumulator.ps, accumulator.nodes
+        manifest["counts"] = accumulator.counts.tolist()
+        manifest["history"].append({"trials": len(arrays["p"]), "seed": seed, "time": now})
+        manifest["created"] = manifest["created"] or now
+        manifest["updated"] = now
+        self._write_manifest(manifest)
+        return len(arrays["p"])
+
+    def load(self):
+        """The store's `Accumulator` (empty if the store is)."""
+        path = os.path.join(self.path, SUMMARY)
+        if not os.path.exists(path):
+            return Accumulator()
+        return Accumulator.load(path)
+
+    def read(self, fields=None):
+        raise ValueError("{0} only keeps a summary of its trials.".format(self.path))
+
+    def results(self):
+        return self.read()
+
+    def compact(self):
+        pass
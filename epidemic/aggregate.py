@@ -0,0 +1,138 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+from epidemic.accumulate import SummaryStore
+from epidemic.store import ResultsStore, load_results, store_path_of
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+KINDS = ("size", "length")
+
+
+def column_names(quantiles=QUANTILES):
+    names = ["p", "node", "count"]
+    for kind in KINDS:
+        names += [kind + "_mean", kind + "_std"]
+        names += ["{0}_q{1:g}".format(kind, 100 * q) for q in quantiles]
+    return names
+
+
+def summarize(results, quantiles=QUANTILES):
+    """Summary statistics of every (p, node) cell of a `Results`, computed
+    over the trial axis one p at a time, so that a memory-mapped store is
+    only read a slice at a time.
+
+    Returns
+    -------
+    A dict of columns, one row per cell in (p, node) order: "p", "node",
+    "count", and for each of "size" and "length" its "_mean", "_std"
+    (sample standard deviation) and one "_q<percent>" column per quantile.
+    Statistics are NaN for cells without (enough) trials.
+
+    """
+    n_p, n_nodes = results.counts.shape
+    i, j = np.indices((n_p, n_nodes)).reshape(2, -1)
+    columns = {"p": np.asarray(results.ps, dtype=np.float64)[i],
+               "node": np.asarray(results.nodes, dtype=np.int64)[j],
+               "count": results.counts.ravel()}
+    trials = np.arange(results.size.shape[2])
+    for kind in KINDS:
+        std = np.full((n_p, n_nodes), np.nan)
+        quantile_values = np.full((len(quantiles), n_p, n_nodes), np.nan)
+        for row in range(n_p):
+            if not len(trials):
+                break
+            # The trials of one p, padding masked out
+            valid = trials < results.counts[row][:, np.newaxis]
+            values = np.where(valid, getattr(results, kind)[row].astype(np.float64), np.nan)
+            with warnings.catch_warnings():
+                # Cells with fewer than two trials
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                std[row] = np.nanstd(values, axis=1, ddof=1)
+                quantile_values[:, row] = np.nanpercentile(values, [100 * q for q in quantiles], axis=1)
+        columns[kind + "_mean"] = results.mean(kind).ravel()
+        columns[kind + "_std"] = std.ravel()
+        for q, value in zip(quantiles, quantile_values):
+            columns["{0}_q{1:g}".format(kind, 100 * q)] = value.ravel()
+    return columns
+
+
+def summarize_accumulator(accumulator, quantiles=QUANTILES):
+    """The columns of `summarize`, from an `epidemic.accumulate.Accumulator`
+    instead of the trials.
+
+    """
+    n_p, n_nodes = accumulator.counts.shape
+    i, j = np.indices((n_p, n_nodes)).reshape(2, -1)
+    columns = {"p": np.asarray(accumulator.ps, dtype=np.float64)[i],
+               "node": np.asarray(accumulator.nodes, dtype=np.int64)[j],
+               "count": accumulator.counts.ravel()}
+    for kind in KINDS:
+        columns[kind + "_mean"] = accumulator.mean(kind).ravel()
+        columns[kind + "_std"] = accumulator.std(kind).ravel()
+        for q, value in zip(quantiles, accumulator.quantiles(kind, quantiles)):
+            columns["{0}_q{1:g}".format(kind, 100 * q)] = value.ravel()
+    return columns
+
+
+def fingerprint_of(cache_dir):
+    """A string that changes whenever the results behind `cache_dir` do:
+    the shards, base and last update of its store, or else the size and
+    modification time of its pickle.
+
+    """
+    store = ResultsStore(store_path_of(cache_dir))
+    if store.exists():
+        header = store.header()
+        return "store:{0}:{1}:{2}".format(header["updated"], header["base"],
+                                          ",".join(header["shards"]))
+    status = os.stat(cache_dir)
+    return "pickle:{0}:{1}".format(status.st_mtime, status.st_size)
+
+
+def summary_path_of(cache_dir):
+    return store_path_of(cache_dir) + "_summary.npz"
+
+
+def model_of_path(cache_dir):
+    return "SI_random_jump" if "random_jump" in cache_dir else "SI"
+
+
+def summary_table(cache_dir, department=None, quantiles=QUANTILES):
+    """The summary of a cache path like "cache/CS_SI.p", as a DataFrame with
+    one row per (department, model, p, node); see `summarize` for the
+    columns.
+
+    The table is saved next to the cache and only recomputed when the
+    results (or the quantiles asked for) change. A `SummaryStore` is read
+    directly, its quantiles coming from its histograms.
+
+    Parameters
+    ----------
+    department : name filled into the "department" column (defaults to the
+        path's store name, e.g. "CS_SI")
+
+    """
+    key = "{0}|{1}".format(fingerprint_of(cache_dir), ",".join(repr(q) for q in quantiles))
+    path = summary_path_of(cache_dir)
+    columns = None
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if str(cached["key"]) == key:
+                columns = dict((name, cached[name]) for name in cached.files if name != "key")
+    if columns is None:
+        header = ResultsStore(store_path_of(cache_dir)).header()
+        if header is not None and header["kind"] == "summary":
+            columns = summarize_accumulator(SummaryStore(store_path_of(cache_dir)).load(), quantiles)
+        else:
+            columns = summarize(load_results(cache_dir), quantiles)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, key=np.array(key), **columns)
+        os.rename(tmp, path)
+
+    table = pd.DataFrame(columns, columns=column_names(quantiles))
+    table.insert(0, "model", model_of_path(cache_dir))
+    table.insert(0, "department", department or os.path.basename(store_path_of(cache_dir)))
+    return table
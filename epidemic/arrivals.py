@@ -0,0 +1,208 @@
+import json
+import os
+import numpy as np
+
+from epidemic.blocks import prestige_groups
+
+HEADER = "header.json"
+ARRAYS = ("trials", "counts", "time_sums", "histogram")
+# Arrival times are whole generations; later arrivals are counted in the
+# last histogram bin
+MAX_TIME = 32
+
+
+class ArrivalTimes(object):
+    """When the epidemics from every source reach every target, per p.
+
+    Accumulates, for every (p, source, target) cell, how many epidemics
+    reached the target and when, without keeping the runs themselves:
+
+    - trials[i, s]: epidemics run at ps[i] from sources[s]
+    - counts[i, s, v]: of those, how many infected nodes[v]
+    - time_sums[i, s, v]: the sum of their arrival times at nodes[v]
+    - histogram[i, s, v, t]: how many arrived at time t
+
+    The arrival time of a node is its generation: 0 for the source, 1 for
+    the nodes it infects, and so on (one more than the node's time in
+    `SI.timeline`, except for the source). The arrays live in .npy files
+    under `path`, opened memory-mapped, so tensors of every source and
+    target need not fit in memory; pass one as the `arrivals` of
+    `simulate_batch` to fill it.
+
+    Use `create`, `open` or `open_or_create` rather than the constructor.
+
+    """
+    def __init__(self, path, header, arrays):
+        self.path = path
+        self.ps = header["ps"]
+        self.sources = header["sources"]
+        self.nodes = header["nodes"]
+        self.max_time = header["max_time"]
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def create(cls, path, ps, sources, nodes, max_time=MAX_TIME):
+        """Empty arrival times for a (ps, sources, nodes) grid, in a new
+        directory `path` (whose files are overwritten if it exists).
+
+        """
+        header = {"ps": [float(p) for p in ps],
+                  "sources": [int(source) for source in sources],
+                  "nodes": [int(node) for node in nodes],
+                  "max_time": int(max_time)}
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with open(os.path.join(path, HEADER), "w") as outfile:
+            json.dump(header, outfile, indent=4)
+
+        shape = (len(header["ps"]), len(header["sources"]))
+        shapes = {"trials": shape,
+                  "counts": shape + (len(header["nodes"]),),
+                  "time_sums": shape + (len(header["nodes"]),),
+                  "histogram": shape + (len(header["nodes"]), header["max_time"])}
+        dtypes = {"trials": np.int64, "counts": np.int32,
+                  "time_sums": np.float64, "histogram": np.int32}
+        arrays = {}
+        for name in ARRAYS:
+            arrays[name] = np.lib.format.open_memmap(os.path.join(path, name + ".npy"), mode="w+",
+                                                     dtype=dtypes[name], shape=shapes[name])
+            arrays[name][...] = 0
+        return cls(path, header, arrays)
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """The arrival times saved under `path`; mode="r+" to add to them."""
+        with open(os.path.join(path, HEADER)) as infile:
+            header = json.load(infile)
+        arrays = dict((name, np.load(os.path.join(path, name + ".npy"), mmap_mode=mode))
+                      for name in ARRAYS)
+        return cls(path, header, arrays)
+
+    @classmethod
+    def open_or_create(cls, path, ps, sources, nodes, max_time=MAX_TIME):
+        """The arrival times under `path`, opened to add to, or new ones if
+        there are none yet. Raises ValueError if they are on another grid.
+
+        """
+        if not os.path.exists(os.path.join(path, HEADER)):
+            return cls.create(path, ps, sources, nodes, max_time)
+        arrivals = cls.open(path, mode="r+")
+        if (arrivals.ps != [float(p) for p in ps] or
+                arrivals.sources != [int(source) for source in sources] or
+                arrivals.nodes != [int(node) for node in nodes]):
+            raise ValueError("{0} holds arrival times on another grid.".format(path))
+        return arrivals
+
+    def add(self, p_index, source_index, arrival):
+        """Add a batch of epidemics.
+
+        Parameters
+        ----------
+        p_index, source_index : for every epidemic, the index of its p in
+            `ps` and of its source in `sources`
+
+        arrival : array of shape (n_epidemics, len(nodes)), the arrival time
+            of every node in every epidemic, negative if it was not infected
+
+        """
+        n_nodes = len(self.nodes)
+        cells = np.asarray(p_index) * len(self.sources) + np.asarray(source_index)
+        # Only the slots an epidemic touched are read and written, so a
+        # batch costs no more than its infections, however big the arrays
+        np.add.at(self.trials.reshape(-1), cells, 1)
+
+        epidemics, targets = np.nonzero(arrival >= 0)
+        times = arrival[epidemics, targets]
+        slots = cells[epidemics] * n_nodes + targets
+        np.add.at(self.counts.reshape(-1), slots, 1)
+        np.add.at(self.time_sums.reshape(-1), slots, times)
+        bins = slots * self.max_time + np.minimum(times, self.max_time - 1)
+        np.add.at(self.histogram.reshape(-1), bins, 1)
+
+    def flush(self):
+        """Write what was added to disk."""
+        for name in ARRAYS:
+            array = getattr(self, name)
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def probability(self):
+        """The probability that each target gets infected, an array of shape
+        (n_p, n_sources, n_nodes), NaN for cells without trials.
+
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.trials[:, :, np.newaxis] > 0,
+                            self.counts / self.trials[:, :, np.newaxis].astype(np.float64), np.nan)
+
+    def mean_time(self):
+        """The mean arrival time at each target, over the epidemics that
+        reached it (NaN if none did).
+
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.counts > 0, self.time_sums / self.counts, np.nan)
+
+    def quantile_time(self, q):
+        """The q-th quantile of the arrival time at each target, over the
+        epidemics that reached it, interpolated between them like
+        `numpy.percentile` (NaN if none did). Exact as long as every arrival
+        is earlier than `max_time`.
+
+        """
+        histogram = np.asarray(self.histogram)
+        cumulative = np.cumsum(histogram, axis=3)
+
+        def order_statistic(rank):
+            # The rank-th earliest arrival of every cell
+            return np.minimum((cumulative <= rank[..., np.newaxis]).sum(axis=3), self.max_time - 1)
+
+        h = q * np.maximum(np.asarray(self.counts) - 1, 0)
+        low = order_statistic(np.floor(h))
+        high = order_statistic(np.ceil(h))
+        return np.where(self.counts > 0, low + (h - np.floor(h)) * (high - low), np.nan)
+
+
+def group_delays(arrivals, p, n_groups=10, prestige=None):
+    """Prestige-to-prestige diffusion at transmission probability p.
+
+    Sources and targets are split into prestige groups as in
+    `epidemic.blocks.prestige_groups`, and every (source group, target
+    group) cell averages over the epidemics from the group's sources and
+    the group's targets.
+
+    Parameters
+    ----------
+    arrivals : an `ArrivalTimes`
+
+    p : one of `arrivals.ps`
+
+    n_groups, prestige : as for `epidemic.blocks.prestige_block_matrix`
+
+    Returns
+    -------
+    Two arrays of shape (n_groups, n_groups): the probability that a target
+    of the column's group gets infected by an epidemic from the row's
+    group, and the mean arrival time of those infections (NaN for none).
+
+    """
+    i = arrivals.ps.index(float(p))
+    source_group = prestige_groups(arrivals.sources, n_groups, prestige)
+    target_group = prestige_groups(arrivals.nodes, n_groups, prestige)
+
+    def by_groups(values):
+        # Sum over sources, then over targets, of each group
+        rows = np.zeros((n_groups,) + values.shape[1:])
+        np.add.at(rows, source_group, values)
+        cells = np.zeros((n_groups, n_groups))
+        np.add.at(cells.T, target_group, rows.T)
+        return cells
+
+    trials = by_groups(np.repeat(np.asarray(arrivals.trials[i], dtype=np.float64)[:, np.newaxis],
+                                 len(arrivals.nodes), axis=1))
+    counts = by_groups(np.asarray(arrivals.counts[i], dtype=np.float64))
+    time_sums = by_groups(np.asarray(arrivals.time_sums[i]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (np.where(trials > 0, counts / trials, np.nan),
+                np.where(counts > 0, time_sums / counts, np.nan))
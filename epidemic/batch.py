@@ -0,0 +1,140 @@
+import numpy as np
+
+from epidemic.csr import CSRGraph
+from epidemic.exact import exact_outcome
+
+
+def simulate_batch(graph, sources, ps, n_trials, max_replicas=2**15, rng=None, arrivals=None):
+    """Run many independent SI epidemics side by side.
+
+    Every (p, source, trial) triple is a replica. All replicas are advanced
+    one step at a time, with their state held in boolean matrices of shape
+    (n_replicas, n_nodes) and the coins for every edge tried during a step
+    drawn in a single call. Each replica behaves exactly like
+    `SI(graph, p).infect_node(source); simulate()`. Transmission
+    probabilities whose outcome does not depend on chance, like p=0 and
+    p=1, are filled in by `exact_outcome` instead of being simulated.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    sources : node labels to start the epidemics from. Labels that are not
+        in the graph give an empty epidemic, like `SI.infect_node` does.
+
+    ps : transmission probabilities
+
+    n_trials : number of epidemics per (p, source) pair
+
+    max_replicas : upper bound on the number of replicas advanced together,
+        which bounds memory use at roughly max_replicas * n_nodes bytes
+
+    rng : the `numpy.random.Generator` to draw from (see `epidemic.rng`),
+        by default a freshly seeded one
+
+    arrivals : an `epidemic.arrivals.ArrivalTimes` on the (ps, sources,
+        graph.nodes) grid, opened to add to, into which the arrival time of
+        every node in every epidemic is accumulated (None to not record
+        them). Every p is then simulated, exact or not.
+
+    Returns
+    -------
+    A dict with "size" and "length" arrays of shape
+    (len(ps), len(sources), n_trials).
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    if rng is None:
+        rng = np.random.default_rng()
+    ps = np.asarray(ps, dtype=np.float64)
+    ids = np.array([graph.index.get(node, -1) for node in sources], dtype=np.int64)
+
+    n_cells = len(ps) * len(ids)
+    sizes = np.zeros((len(ps), len(ids), n_trials), dtype=np.float64)
+    lengths = np.zeros((len(ps), len(ids), n_trials), dtype=np.int64)
+    if n_cells == 0 or n_trials == 0:
+        return {"size": sizes, "length": lengths}
+
+    simulated = []
+    for i, p in enumerate(ps):
+        # Arrival times need the runs themselves
+        outcome = exact_outcome(graph, sources, p) if arrivals is None else None
+        if outcome is None:
+            simulated.append(i)
+            continue
+        sizes[i] = outcome["size"][:, np.newaxis]
+        lengths[i] = outcome["length"][:, np.newaxis]
+    if not simulated:
+        return {"size": sizes, "length": lengths}
+
+    chunk = max(1, min(n_trials, max_replicas // (len(simulated) * len(ids))))
+    for start in range(0, n_trials, chunk):
+        stop = min(n_trials, start + chunk)
+        size, length, arrival = _simulate_chunk(graph, ids, ps[simulated], stop - start, rng,
+                                                arrivals is not None)
+        if arrivals is not None:
+            p_of, source_of, _ = np.unravel_index(np.arange(len(arrival)), size.shape)
+            arrivals.add(np.array(simulated)[p_of], source_of, arrival)
+        sizes[simulated, :, start:stop] = size
+        lengths[simulated, :, start:stop] = length
+
+    if arrivals is not None:
+        arrivals.flush()
+    return {"size": sizes, "length": lengths}
+
+
+def _simulate_chunk(graph, ids, ps, n_trials, rng, record_arrivals=False):
+    n = graph.number_of_nodes()
+    shape = (len(ps), len(ids), n_trials)
+    n_replicas = int(np.prod(shape))
+
+    # Replica r runs at ps[p_of[r]] from ids[source_of[r]]
+    p_of, source_of, _ = np.unravel_index(np.arange(n_replicas), shape)
+    sources = ids[source_of]
+    seeded = sources >= 0
+
+    # Transmission probability of every edge at each p
+    probabilities = np.array([graph.transmission_probabilities(p) for p in ps])
+
+    infected = np.zeros(n_replicas * n, dtype=bool)
+    infected[np.flatnonzero(seeded) * n + sources[seeded]] = True
+    frontier = np.flatnonzero(seeded) * n + sources[seeded]
+    newly_infected = np.zeros(n_replicas * n, dtype=bool)
+    arrival = None
+    if record_arrivals:
+        # Generation every node was infected in, -1 if it was not
+        arrival = np.full(n_replicas * n, -1, dtype=np.int16)
+        arrival[frontier] = 0
+
+    length = np.ones(n_replicas, dtype=np.int64)
+    time = 0
+    while len(frontier) > 0:
+        # Every out-edge of the frontier, paired with its replica. States
+        # are indexed by replica * n + node.
+        replicas, nodes = frontier // n, frontier % n
+        counts = graph.indptr[nodes + 1] - graph.indptr[nodes]
+        edges = graph.out_edges(nodes)
+        offsets = np.repeat(replicas * n, counts)
+
+        targets = offsets + graph.indices[edges]
+        susceptible = ~infected[targets]
+        edges, offsets, targets = edges[susceptible], offsets[susceptible], targets[susceptible]
+
+        hits = rng.random(len(edges)) <= probabilities[p_of[offsets // n], edges]
+
+        # A node hit by several edges is infected once
+        newly_infected[targets[hits]] = True
+        frontier = np.flatnonzero(newly_infected)
+        newly_infected[frontier] = False
+        infected[frontier] = True
+
+        time += 1
+        length[frontier // n] = time + 1
+        if record_arrivals:
+            arrival[frontier] = time
+
+    size = infected.reshape(n_replicas, n).sum(axis=1) / float(n)
+    if record_arrivals:
+        arrival = arrival.reshape(n_replicas, n)
+    return size.reshape(shape), length.reshape(shape), arrival
@@ -0,0 +1,94 @@
+import numpy as np
+
+from epidemic.csr import CSRGraph
+
+
+def prestige_groups(nodes, n_groups=10, prestige=None):
+    """The prestige group of every node, from 0 (most prestigious) to
+    n_groups - 1, as an array indexed like `nodes`. Groups are of (nearly)
+    equal size; see `prestige_block_matrix` for `prestige`.
+
+    """
+    n = len(nodes)
+    if prestige is None:
+        scores = np.asarray(nodes)
+    else:
+        scores = np.array([prestige[node] for node in nodes], dtype=np.float64)
+
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.argsort(scores, kind='mergesort')] = np.arange(n)
+    return rank * n_groups // max(n, 1)
+
+
+def prestige_block_matrix(graph, n_groups=10, prestige=None):
+    """Hires between prestige groups.
+
+    Nodes are sorted by prestige, most prestigious first, and split into
+    n_groups groups of (nearly) equal size. Entry (a, b) of the result is
+    the total weight of the edges from a node of group a to a node of
+    group b, i.e. of the hires from a PhD institution in group a by an
+    institution in group b.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile. Edge weights are
+        counted (1.0 for edges without one), and parallel edges add up.
+
+    n_groups : number of prestige groups, e.g. 10 for deciles
+
+    prestige : prestige score of every node, lower being more prestigious
+        (e.g. each school's "pi"). Defaults to the node labels, since the
+        vertex lists number schools in order of prestige.
+
+    Returns
+    -------
+    A float array of shape (n_groups, n_groups).
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    group = prestige_groups(graph.nodes, n_groups, prestige)
+
+    sources = np.repeat(group, np.diff(graph.indptr))
+    targets = group[graph.indices]
+    counts = np.bincount(sources * n_groups + targets, weights=graph.total_weights(),
+                         minlength=n_groups * n_groups)
+    return counts.reshape(n_groups, n_groups)
+
+
+def position_block_matrix(graph, groups):
+    """Hires between groups of node positions, binned as the grouped
+    adjacency figure always has been.
+
+    Nodes are taken in the graph's order, which for the vertex lists is
+    the order of prestige. A column (the hiring institution) at position t
+    falls in group k when groups[k] <= t < groups[k+1], the last group
+    including its upper edge, as `numpy.histogram` bins; a row (the PhD
+    institution) at position i falls in the first group k with
+    i <= groups[k+1]. Positions past groups[-1] are left out.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile. Edge weights are
+        counted (1.0 for edges without one), and parallel edges add up.
+
+    groups : increasing group edges, e.g. np.linspace(0, 100, 11)
+
+    Returns
+    -------
+    A float array of shape (len(groups) - 1, len(groups) - 1).
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    groups = np.asarray(groups, dtype=np.float64)
+    n_groups = len(groups) - 1
+    sources = np.repeat(np.arange(graph.number_of_nodes()), np.diff(graph.indptr))
+    targets = graph.indices
+
+    rows = np.searchsorted(groups[1:], sources, side='left')
+    columns = np.minimum(np.searchsorted(groups, targets, side='right') - 1, n_groups - 1)
+    kept = (rows < n_groups) & (targets >= groups[0]) & (targets <= groups[-1])
+    counts = np.bincount(rows[kept] * n_groups + columns[kept], weights=graph.weights[kept],
+                         minlength=n_groups * n_groups)
+    return counts.reshape(n_groups, n_groups)
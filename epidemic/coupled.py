@@ -0,0 +1,150 @@
+import numpy as np
+
+from epidemic.csr import CSRGraph
+from epidemic.exact import exact_outcome
+
+
+def simulate_coupled(graph, sources, ps, n_trials, max_draws=2**24, rng=None):
+    """Run SI epidemics at every transmission probability at once.
+
+    `SI` transmits over an edge of weight w when its coin u <= p * w, so a
+    single uniform u per edge decides the edge for every p: it transmits
+    exactly when p >= u / w, the edge's threshold (see
+    `CSRGraph.transmission_thresholds`). Each (source, trial)
+    pair draws its thresholds once, and the epidemic at p infects the
+    nodes reachable over edges with thresholds <= p. For every node, the
+    smallest such p over paths of at most k hops (the lowest, over those
+    paths, of their highest threshold) is found for k = 0, 1, ... in one
+    Bellman-Ford-like pass, which gives the size and the length of the
+    epidemic at every p of the grid together. Each round only relaxes the
+    out-edges of the nodes whose p dropped in the round before. The results at each p
+    follow the same distribution as `SI.simulate()`'s, and the cost
+    hardly depends on the number of probabilities, so fine grids such as
+    np.linspace(0, 1, 101) come almost for free. The epidemics of one
+    (source, trial) pair at different p are coupled: their sizes never
+    decrease as p grows, which smooths size-vs-p curves.
+
+    Transmission probabilities whose outcome does not depend on chance,
+    like p=0 and p=1, are filled in by `exact_outcome` instead of being
+    simulated. Random jumps are not modelled.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    sources : node labels to start the epidemics from. Labels that are not
+        in the graph give an empty epidemic, like `SI.infect_node` does.
+
+    ps : transmission probabilities
+
+    n_trials : number of epidemics per source, each giving a result for
+        every p
+
+    max_draws : upper bound on the number of edge thresholds held at
+        once, which bounds memory use at roughly 8 * max_draws bytes
+
+    rng : the `numpy.random.Generator` to draw from (see `epidemic.rng`),
+        by default a freshly seeded one
+
+    Returns
+    -------
+    A dict with "size" and "length" arrays of shape
+    (len(ps), len(sources), n_trials), like `simulate_batch`.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    if rng is None:
+        rng = np.random.default_rng()
+    ps = np.asarray(ps, dtype=np.float64)
+    ids = np.array([graph.index.get(node, -1) for node in sources], dtype=np.int64)
+
+    sizes = np.zeros((len(ps), len(ids), n_trials), dtype=np.float64)
+    lengths = np.ones((len(ps), len(ids), n_trials), dtype=np.int64)
+    valid = np.flatnonzero(ids >= 0)
+    if len(ps) == 0 or len(valid) == 0 or n_trials == 0:
+        return {"size": sizes, "length": lengths}
+
+    simulated = []
+    for i, p in enumerate(ps):
+        outcome = exact_outcome(graph, sources, p)
+        if outcome is None:
+            simulated.append(i)
+            continue
+        sizes[i] = outcome["size"][:, np.newaxis]
+        lengths[i] = outcome["length"][:, np.newaxis]
+    if not simulated:
+        return {"size": sizes, "length": lengths}
+
+    # Sorted, so that each threshold maps to the first p it transmits at
+    simulated = np.array(simulated)
+    order = simulated[np.argsort(ps[simulated], kind='mergesort')]
+    chunk = max(1, min(n_trials, max_draws // (len(valid) * max(graph.number_of_edges(), 1))))
+    for start in range(0, n_trials, chunk):
+        stop = min(n_trials, start + chunk)
+        size, length = _simulate_chunk(graph, ids[valid], ps[order], stop - start, rng)
+        sizes[np.ix_(order, valid, np.arange(start, stop))] = size
+        lengths[np.ix_(order, valid, np.arange(start, stop))] = length
+
+    return {"size": sizes, "length": lengths}
+
+
+def _simulate_chunk(graph, ids, ps, n_trials, rng):
+    n = graph.number_of_nodes()
+    n_p = len(ps)
+    n_replicas = len(ids) * n_trials
+
+    # Only the grid matters, so every threshold is kept as the index of
+    # the first p it transmits at (n_p if none), one row per (source,
+    # trial) replica
+    dtype = np.int16 if n_p < 2**15 else np.int64
+    thresholds = graph.transmission_thresholds(rng.random((n_replicas, graph.number_of_edges())))
+    thresholds = np.searchsorted(ps, thresholds, side='left').astype(dtype).ravel()
+
+    # lowest[r * n + v]: the first p at which node v is infected within k
+    # hops in replica r. Only the out-edges of the nodes whose lowest p
+    # dropped in the previous round can lower it any further.
+    lowest = np.full(n_replicas * n, n_p, dtype=dtype)
+    frontier = np.arange(n_replicas) * n + np.repeat(ids, n_trials)
+    lowest[frontier] = 0
+    within = [lowest.copy()]
+    changed = np.zeros(n_replicas * n, dtype=bool)
+    while True:
+        replicas, nodes = frontier // n, frontier % n
+        counts = graph.indptr[nodes + 1] - graph.indptr[nodes]
+        edges = graph.out_edges(nodes)
+        replicas = np.repeat(replicas, counts)
+
+        through = np.maximum(np.repeat(lowest[frontier], counts),
+                             thresholds[replicas * graph.number_of_edges() + edges])
+        targets = replicas * n + graph.indices[edges]
+        lower = through < lowest[targets]
+        if not lower.any():
+            break
+        targets, through = targets[lower], through[lower]
+        np.minimum.at(lowest, targets, through)
+        changed[targets] = True
+        frontier = np.flatnonzero(changed)
+        changed[frontier] = False
+        within.append(lowest.copy())
+
+    # Node v is infected at ps[j] when lowest[r * n + v] <= j
+    lowest = lowest.reshape(n_replicas, n)
+    bins = (n_p + 1) * np.arange(n_replicas)[:, np.newaxis]
+    counts = np.bincount((bins + lowest).ravel(), minlength=n_replicas * (n_p + 1))
+    size = np.cumsum(counts.reshape(n_replicas, n_p + 1), axis=1)[:, :n_p] / float(n)
+
+    # At ps[j], node v lies more than k hops away when it is infected but
+    # not within k hops: lowest[r, v] <= j < within[k][r, v]. The length
+    # is one more than the number of k for which some node does.
+    length = np.ones((n_replicas, n_p), dtype=np.int64)
+    for hops in within[:-1]:
+        hops = hops.reshape(n_replicas, n)
+        farther = lowest < hops
+        farther = (np.bincount((bins + lowest)[farther], minlength=n_replicas * (n_p + 1)) -
+                   np.bincount((bins + hops)[farther], minlength=n_replicas * (n_p + 1)))
+        length += np.cumsum(farther.reshape(n_replicas, n_p + 1), axis=1)[:, :n_p] > 0
+
+    shape = (len(ids), n_trials, n_p)
+    return (np.moveaxis(size.reshape(shape), 2, 0),
+            np.moveaxis(length.reshape(shape), 2, 0))
@@ -0,0 +1,387 @@
+import hashlib
+import numpy as np
+from scipy.sparse import csr_matrix
+from timeit import default_timer as timer
+
+from epidemic.reachability import ReachabilityIndex
+
+
+class CSRGraph(object):
+    """A read-only, array-backed copy of a directed (multi)graph.
+
+    Nodes are relabelled to the integers 0..N-1 (in the order networkx
+    reports them) and the out-edges of node i are stored, sorted by target,
+    in indices[indptr[i]:indptr[i+1]]. Parallel edges of a MultiDiGraph are
+    kept as parallel entries.
+
+    Only edges are stored: every other ordered pair of nodes implicitly has
+    weight 0, and so never transmits.
+
+    Parallel edges can be merged with `collapse_parallel_edges`, after
+    which each entry may stand for several edges (its `multiplicity`).
+
+    Parameters
+    ----------
+    graph : a networkx (Multi)DiGraph
+
+    weight : name of the edge attribute holding the edge weight. Edges
+        without the attribute get a weight of 1.0, which matches how `SI`
+        treats them.
+
+    """
+    def __init__(self, graph, weight='weight'):
+        nodes = list(graph.nodes())
+        index = dict((node, i) for i, node in enumerate(nodes))
+        edges = list(graph.edges(data=weight, default=1.0))
+        self._build(nodes,
+                    np.array([index[u] for (u, v, w) in edges], dtype=np.int64),
+                    np.array([index[v] for (u, v, w) in edges], dtype=np.int64),
+                    np.array([float(w) for (u, v, w) in edges], dtype=np.float64))
+
+    @classmethod
+    def from_edges(cls, sources, targets, weights=None, nodes=None):
+        """Build straight from arrays of edge endpoints (node labels).
+
+        Without `nodes`, nodes are numbered in order of first appearance,
+        as `networkx.MultiDiGraph.add_edges_from` would add them.
+
+        """
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        if nodes is None:
+            endpoints = np.column_stack((sources, targets)).ravel()
+            labels, first = np.unique(endpoints, return_index=True)
+            nodes = labels[np.argsort(first)].tolist()
+        labels = np.asarray(nodes)
+        order = np.argsort(labels, kind='mergesort')
+        if weights is None:
+            weights = np.ones(len(sources), dtype=np.float64)
+
+        graph = cls.__new__(cls)
+        graph._build(list(nodes),
+                     order[np.searchsorted(labels, sources, sorter=order)],
+                     order[np.searchsorted(labels, targets, sorter=order)],
+                     np.asarray(weights, dtype=np.float64))
+        return graph
+
+    def _build(self, nodes, sources, targets, weights):
+        self.nodes = nodes
+        self.index = dict((node, i) for i, node in enumerate(nodes))
+        n = len(nodes)
+
+        # Sorting by (source, target, weight) makes the arrays, and so
+        # the content hash, independent of the order edges were added in
+        order = np.lexsort((weights, targets, sources))
+        self.indices = targets[order]
+        self.weights = weights[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=self.indptr[1:])
+        # Number of parallel edges each entry stands for (None: one each)
+        self.multiplicity = None
+
+        self._reachability = None
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def transmission_probabilities(self, p):
+        """Probability that each edge transmits, indexed like `indices`.
+
+        An entry standing for k parallel edges transmits if any of them
+        does, with probability 1 - (1 - p * weight)**k.
+
+        """
+        if self.multiplicity is None:
+            return p * self.weights
+        with np.errstate(divide='ignore'):
+            return -np.expm1(self.multiplicity * np.log1p(-np.minimum(p * self.weights, 1.0)))
+
+    def transmission_thresholds(self, coins):
+        """The smallest p at which each edge transmits, given uniform coins
+        (the last axis indexed like `indices`): an edge transmits when its
+        coin is at most its `transmission_probabilities(p)`.
+
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.multiplicity is None:
+                thresholds = coins / self.weights
+            else:
+                thresholds = -np.expm1(np.log1p(-coins) / self.multiplicity) / self.weights
+        thresholds[..., self.weights <= 0] = np.inf
+        return thresholds
+
+    def total_weights(self):
+        """The weight of each entry times the number of edges it stands for.
+
+        """
+        if self.multiplicity is None:
+            return self.weights
+        return self.weights * self.multiplicity
+
+    def collapse_parallel_edges(self, mode="independent"):
+        """The graph with one entry per group of parallel edges, so that
+        the engines flip one coin per group instead of one per edge.
+
+        Parameters
+        ----------
+        mode : how the parallel edges from u to v transmit together
+
+            "independent": every edge is its own chance to transmit, as in
+                `SI` and `CSRSI` on the uncollapsed graph, so k edges of
+                weight w transmit with probability 1 - (1 - p * w)**k.
+                Edges of different weights are kept apart.
+
+            "single": the hires between two schools count once. The pair
+                transmits with probability p * w, w the largest weight of
+                its edges, however many there are.
+
+        """
+        if mode not in ("independent", "single"):
+            raise ValueError("Unknown mode {0!r}: use \"independent\" or \"single\".".format(mode))
+        n = self.number_of_nodes()
+        sources = np.repeat(np.arange(n), np.diff(self.indptr))
+        # Edges are sorted by (source, target, weight), so every group is
+        # a run of consecutive entries
+        last = np.ones(self.number_of_edges(), dtype=bool)
+        last[:-1] = (sources[1:] != sources[:-1]) | (self.indices[1:] != self.indices[:-1])
+        if mode == "independent":
+            last[:-1] |= self.weights[1:] != self.weights[:-1]
+        first = np.flatnonzero(np.r_[True, last[:-1]]) if len(last) else last
+        edges = np.ones(len(last), dtype=np.int64) if self.multiplicity is None else self.multiplicity
+        multiplicity = np.add.reduceat(edges, first) if len(last) else edges
+
+        graph = CSRGraph.__new__(CSRGraph)
+        graph._build(self.nodes, sources[last], self.indices[last], self.weights[last])
+        if mode == "independent" and (multiplicity > 1).any():
+            graph.multiplicity = multiplicity
+        return graph
+
+    def out_edges(self, ids):
+        """Positions (into `indices`) of every out-edge of the nodes `ids`.
+
+        """
+        starts = self.indptr[ids]
+        counts = self.indptr[ids + 1] - starts
+        offsets = np.cumsum(counts) - counts
+        return np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+
+    def edge_subgraph(self, keep):
+        """The graph on the same nodes with only the edges where the
+        boolean array `keep` (indexed like `indices`) is True.
+
+        """
+        n = self.number_of_nodes()
+        graph = CSRGraph.__new__(CSRGraph)
+        graph.nodes = self.nodes
+        graph.index = self.index
+        graph.indices = self.indices[keep]
+        graph.weights = self.weights[keep]
+        graph.multiplicity = None if self.multiplicity is None else self.multiplicity[keep]
+        sources = np.repeat(np.arange(n), np.diff(self.indptr))
+        graph.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources[keep], minlength=n), out=graph.indptr[1:])
+        graph._reachability = None
+        return graph
+
+    def to_scipy(self):
+        n = self.number_of_nodes()
+        data = np.ones(len(self.indices), dtype=np.int8)
+        return csr_matrix((data, self.indices, self.indptr), shape=(n, n))
+
+    def weight_matrix(self):
+        """Sparse (N, N) matrix whose entry (i, j) is the total weight of the
+        edges from node i to node j, and 0 where there are none.
+
+        """
+        n = self.number_of_nodes()
+        matrix = csr_matrix((self.total_weights(), self.indices, self.indptr), shape=(n, n), copy=True)
+        matrix.sum_duplicates()
+        return matrix
+
+    def content_hash(self):
+        """A hex digest identifying the graph's nodes, edges and weights
+        (and multiplicities, if its parallel edges were collapsed).
+
+        """
+        digest = hashlib.sha1()
+        digest.update(repr(self.nodes).encode("utf-8"))
+        arrays = [self.indptr, self.indices, self.weights]
+        if self.multiplicity is not None:
+            arrays.append(self.multiplicity)
+        for array in arrays:
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    @property
+    def reachability(self):
+        """The graph's `ReachabilityIndex`.
+
+        Loaded on first use and shared by every epidemic on this graph.
+
+        """
+        if self._reachability is None:
+            self._reachability = ReachabilityIndex.of(self)
+        return self._reachability
+
+
+class CSRSI(object):
+    """An SI epidemic model running on a `CSRGraph`.
+
+    Produces the same `size`, `length` and `timeline` as `SI`, but only
+    visits the out-edges of the nodes infected during the previous step
+    (every other edge has already been tried), and flips the coins for a
+    whole step at once. Call `reset` to reuse the same buffers for the
+    next run.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    p : transmission probability
+
+    is_random_jump : for each node u, if that node ever gets infected,
+        give it exactly n_random_jumps (see below) chance to jump to a random
+        node that is not reachable from u
+
+    random_jump_p : probability of a random jump (if is_random_jump is enabled)
+        happening
+
+    n_random_jumps : number of random jumps to try if is_random_jump enabled
+
+    rng : the `numpy.random.Generator` to draw from (see `epidemic.rng`),
+        by default a freshly seeded one
+
+    profile : an `epidemic.profile.Profile` to count the work of every
+        step into, across runs (None to not count anything). There is no
+        "copy" phase: only the frontier is visited.
+
+    """
+    def __init__(self,
+                 graph,
+                 p=0.5,
+                 is_random_jump=False,
+                 random_jump_p=0.001,
+                 n_random_jumps=1,
+                 rng=None,
+                 profile=None):
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph(graph)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.profile = profile
+        self.p = p
+        self.graph = graph
+        self.probabilities = graph.transmission_probabilities(p)
+        self.infected = np.zeros(graph.number_of_nodes(), dtype=bool)
+        self.is_random_jump = is_random_jump
+        if is_random_jump:
+            self.random_jump_p = random_jump_p
+            self.n_random_jumps = n_random_jumps
+        self.reset()
+
+    def reset(self, p=None, random_jump_p=None, rng=None):
+        """Clear the state of the previous run, optionally changing p,
+        random_jump_p or the random stream for the next one.
+
+        """
+        if rng is not None:
+            self.rng = rng
+        if p is not None and p != self.p:
+            self.p = p
+            self.probabilities = self.graph.transmission_probabilities(p)
+        if random_jump_p is not None:
+            self.random_jump_p = random_jump_p
+        self.infected[:] = False
+        self.n_infected = 0
+        self.frontier = []
+        self.time = 0
+        self.timeline = []
+        self.is_complete = False
+
+    def infect_random_node(self):
+        susceptible = np.flatnonzero(~self.infected)
+        if len(susceptible) == 0:
+            print("No susceptible nodes to infect.")
+            return
+        self.infect_id(self.rng.choice(susceptible))
+
+    def infect_node(self, node):
+        """Infect a node if it is susceptible.
+
+        """
+        i = self.graph.index.get(node)
+        if i is not None:
+            self.infect_id(i)
+
+    def infect_id(self, i):
+        if self.infected[i]:
+            return
+        self.infected[i] = True
+        self.n_infected += 1
+        self.frontier.append(i)
+        self.timeline.append((self.graph.nodes[i], self.time))
+        self.is_complete = False
+
+    def __infect_step(self):
+        # The epidemic is complete if time passed,
+        # but the infection didn't spread.
+        self.is_complete = True
+        frontier = np.array(self.frontier, dtype=np.int64)
+        self.frontier = []
+        profile = self.profile
+        if len(frontier) == 0:
+            if profile is not None:
+                profile.record(self.time)
+            return
+        if profile is not None:
+            n_infected = self.n_infected
+            start = timer()
+
+        edges = self.graph.out_edges(frontier)
+        examined = len(edges); jumps = 0
+        edges = edges[~self.infected[self.graph.indices[edges]]]
+        coins = self.rng.random(len(edges)) <= self.probabilities[edges]
+        for v in np.unique(self.graph.indices[edges[coins]]):
+            self.infect_id(v)
+        if profile is not None:
+            now = timer()
+            profile.add_time("edges", now - start)
+            start = now
+
+        if self.is_random_jump:
+            reachability = self.graph.reachability
+            for u in frontier:
+                candidates = np.flatnonzero(~(reachability.reachable_mask(u) | self.infected))
+                if len(candidates) == 0:
+                    continue
+                n = min(int(self.n_random_jumps), len(candidates))
+                jumps += n
+                for v in self.rng.choice(candidates, n, replace=False):
+                    if self.rng.random() <= self.random_jump_p:
+                        self.infect_id(v)
+            if profile is not None:
+                profile.add_time("random_jump", timer() - start)
+        if profile is not None:
+            profile.record(self.time, frontier=len(frontier), edges_examined=examined,
+                           edges_skipped=examined - len(edges), coin_flips=len(edges) + jumps,
+                           random_jump_attempts=jumps,
+                           infections=self.n_infected - n_infected)
+
+    def step(self):
+        if not self.is_complete:
+            self.__infect_step()
+
+    def simulate(self):
+        while not self.is_complete:
+            self.step()
+            self.time += 1
+
+    @property
+    def size(self):
+        return self.n_infected/float(self.graph.number_of_nodes())
+
+    @property
+    def length(self):
+        return self.time
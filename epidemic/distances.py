@@ -0,0 +1,76 @@
+import os
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+
+from epidemic.csr import CSRGraph
+from epidemic.reachability import CACHE_DIR, save_atomically
+
+# Distance matrices already loaded by this process, by graph content hash
+_loaded = {}
+
+
+def hop_distances(graph, cache_dir=CACHE_DIR):
+    """Number of edges on the shortest path between every pair of nodes.
+
+    Computed with one breadth-first search per source, and kept in memory
+    and in `cache_dir` (keyed by the graph's content hash) like the
+    `ReachabilityIndex`. Pass cache_dir=None to skip the disk.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    Returns
+    -------
+    An int16 array of shape (N, N), indexed like `graph.nodes`, holding -1
+    where there is no path.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    key = graph.content_hash()
+    if key in _loaded:
+        return _loaded[key]
+
+    path = None if cache_dir is None else \
+        os.path.join(cache_dir, "distances-{0}.npy".format(key))
+    distances = None
+    if path is not None and os.path.exists(path):
+        try:
+            distances = np.load(path)
+        except (OSError, ValueError, EOFError):
+            # Unreadable, e.g. left half-written by a crash: recompute it
+            distances = None
+    if distances is None:
+        hops = shortest_path(graph.to_scipy(), method='D', directed=True, unweighted=True)
+        distances = np.where(np.isinf(hops), -1, hops).astype(np.int16)
+        if path is not None:
+            save_atomically(path, lambda f: np.save(f, distances))
+
+    _loaded[key] = distances
+    return distances
+
+
+def mean_reachable_distance(graph, include_self=False, cache_dir=CACHE_DIR):
+    """Average hop distance from every node to the nodes it can reach.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    include_self : count each node as reaching itself at distance 0, as
+        networkx.single_source_shortest_path_length does
+
+    Returns
+    -------
+    A float array indexed like the compiled graph's nodes, which is 0 for
+    nodes that reach nothing.
+
+    """
+    distances = hop_distances(graph, cache_dir)
+    reachable = distances >= 0
+    if not include_self:
+        np.fill_diagonal(reachable, False)
+    counts = reachable.sum(axis=1)
+    totals = np.where(reachable, distances, 0).sum(axis=1, dtype=np.float64)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), 0.0)
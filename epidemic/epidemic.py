@@ -1,12 +1,16 @@
 import random
 import networkx as nx
+import numpy as np
 from collections import defaultdict
+from timeit import default_timer as timer
 
-def flip(p, weight=None):
+from epidemic.csr import CSRGraph
+
+def flip(p, weight=None, rng=random):
     if weight is None:
-        return True if random.random() <= p else False
+        return True if rng.random() <= p else False
     else:
-        return True if random.random() <= p*float(weight) else False
+        return True if rng.random() <= p*float(weight) else False
 
 
 def filter_from(edges, from_node):
@@ -16,9 +20,41 @@ def filter_from(edges, from_node):
     return set([edge for edge in edges if edge[0] != from_node])
 
 
+class SIState(object):
+    """The per-run state of an SI epidemic.
+
+    Kept apart from the graph so that one `SI` can be re-run many times,
+    clearing these buffers between runs instead of allocating new ones.
+
+    """
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.susceptible = set(nodes)
+        self.infected = set()
+        self.visited_edges = set()
+        self.attempted_random_jump = defaultdict(bool)
+        self.time = 0
+        self.timeline = []
+        self.is_complete = False
+
+    def reset(self):
+        self.susceptible.clear()
+        self.susceptible.update(self.nodes)
+        self.infected.clear()
+        self.visited_edges.clear()
+        self.attempted_random_jump.clear()
+        self.time = 0
+        # Callers may still hold on to the previous timeline
+        self.timeline = []
+        self.is_complete = False
+
+
 class SI(object):
     """An SI epidemic model.
 
+    The graph is only read, never modified, so one graph (and one `SI`,
+    see `reset`) can be shared by every run of a sweep.
+
     Parameters
     ----------
     graph : the network the epidemic will run on
@@ -34,29 +70,70 @@ class SI(object):
 
     n_random_jumps : number of random jumps to try if is_random_jump enabled
 
+    rng : the `numpy.random.Generator` to draw from (see `epidemic.rng`),
+        by default a freshly seeded one
+
+    profile : an `epidemic.profile.Profile` to count the work of every
+        step into, across runs (None to not count anything)
+
     """
     def __init__(self,
                  graph,
                  p=0.5,
                  is_random_jump=False,
                  random_jump_p=0.001,
-                 n_random_jumps=1):
+                 n_random_jumps=1,
+                 rng=None,
+                 profile=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.profile = profile
         self.p = p
         self.graph = graph
-        self.susceptible = set(nx.nodes(graph))
-        self.infected = set()
-        self.time = 0
-        self.timeline = []
-        self.visited_edges = set()
-        self.is_complete = False
+        self.nodes = frozenset(nx.nodes(graph))
+        self.out_edges = dict((u, [(v, self.get_edge_weight(data))
+                                   for (_, v, data) in graph.edges(u, data=True)])
+                              for u in graph.nodes())
+        self.state = SIState(self.nodes)
         self.is_random_jump = is_random_jump
         if is_random_jump:
-            self.attempted_random_jump = defaultdict(bool)
             self.random_jump_p = random_jump_p
             self.n_random_jumps = n_random_jumps
-            self.descendents = {}
-            for u in self.graph.nodes():
-                self.descendents[u] = nx.descendants(graph, u)
+            self.compiled = CSRGraph(graph)
+            self.node_labels = np.array(self.compiled.nodes)
+            self.reachability = self.compiled.reachability
+
+    def reset(self, p=None, random_jump_p=None, rng=None):
+        """Clear the state of the previous run, optionally changing p,
+        random_jump_p or the random stream for the next one.
+
+        """
+        if rng is not None:
+            self.rng = rng
+        if p is not None:
+            self.p = p
+        if random_jump_p is not None:
+            self.random_jump_p = random_jump_p
+        self.state.reset()
+
+    @property
+    def susceptible(self):
+        return self.state.susceptible
+
+    @property
+    def infected(self):
+        return self.state.infected
+
+    @property
+    def timeline(self):
+        return self.state.timeline
+
+    @property
+    def time(self):
+        return self.state.time
+
+    @property
+    def is_complete(self):
+        return self.state.is_complete
 
     def get_edge_weight(self, attributes):
         weight = None
@@ -66,7 +143,8 @@ class SI(object):
 
     def infect_random_node(self):
         try:
-            random_node = random.choice(list(self.susceptible))
+            susceptible = list(self.state.susceptible)
+            random_node = susceptible[self.rng.integers(len(susceptible))]
             self.infect_node(random_node)
         except:
             print("No susceptible nodes to infect.")
@@ -75,11 +153,12 @@ class SI(object):
         """Infect a node if it is susceptible.
 
         """
+        state = self.state
         try:
-            self.susceptible.remove(node)
-            self.infected.add(node)
-            self.timeline.append((node, self.time))
-            self.is_complete = False
+            state.susceptible.remove(node)
+            state.infected.add(node)
+            state.timeline.append((node, state.time))
+            state.is_complete = False
         except:
             pass
             #print("Node {} is not susceptible.".format(node))
@@ -87,43 +166,69 @@ class SI(object):
     def __infect_step(self):
         # The epidemic is complete if time passed,
         # but the infection didn't spread.
-        self.is_complete = True
-        for u in self.infected.copy():
-            edges_to_try = [(u, v, data) for (u, v, data) in
-                            self.graph.edges(u, data=True)
-                            if v in self.susceptible
-                            and (u, v) not in self.visited_edges]
-            for u, v, data in edges_to_try:
-                weight = self.get_edge_weight(data)
-                self.visited_edges.add((u, v))
-                if flip(self.p, weight):
+        state = self.state
+        state.is_complete = True
+        profile = self.profile
+        if profile is not None:
+            n_infected = len(state.infected)
+            examined = tried = jumps = 0
+            start = timer()
+        infected = state.infected.copy()
+        if profile is not None:
+            profile.add_time("copy", timer() - start)
+        for u in infected:
+            if profile is not None:
+                start = timer()
+            edges_to_try = [(v, weight) for (v, weight) in self.out_edges[u]
+                            if v in state.susceptible
+                            and (u, v) not in state.visited_edges]
+            # One draw for all of u's coins
+            coins = self.rng.random(len(edges_to_try))
+            for (v, weight), coin in zip(edges_to_try, coins):
+                state.visited_edges.add((u, v))
+                if coin <= (self.p if weight is None else self.p*float(weight)):
                     self.infect_node(v)
-            if self.is_random_jump and not self.attempted_random_jump[u]:
-                self.attempted_random_jump[u] = True
-                nodes_of_graph = set(self.graph.nodes())
-                reachable_from_u = self.descendents[u]
-                unreachable_from_u = nodes_of_graph.difference(reachable_from_u)
-                susc_unreachable_from_u = unreachable_from_u.difference(self.infected)
-                if not susc_unreachable_from_u:
-                    continue
-                vs = random.sample(susc_unreachable_from_u, int(self.n_random_jumps))
-                for v in vs:
-                    if flip(self.random_jump_p):
-                        self.infect_node(v)
+            if profile is not None:
+                examined += len(self.out_edges[u])
+                tried += len(edges_to_try)
+                now = timer()
+                profile.add_time("edges", now - start)
+                start = now
+            if self.is_random_jump and not state.attempted_random_jump[u]:
+                state.attempted_random_jump[u] = True
+                unreachable_from_u = self.node_labels[
+                    self.reachability.unreachable_mask(self.compiled.index[u])].tolist()
+                susc_unreachable_from_u = [v for v in unreachable_from_u
+                                           if v not in state.infected]
+                if susc_unreachable_from_u:
+                    picks = self.rng.choice(len(susc_unreachable_from_u), int(self.n_random_jumps),
+                                            replace=False)
+                    for v in [susc_unreachable_from_u[i] for i in picks]:
+                        if flip(self.random_jump_p, rng=self.rng):
+                            self.infect_node(v)
+                    if profile is not None:
+                        jumps += len(picks)
+                if profile is not None:
+                    profile.add_time("random_jump", timer() - start)
+        if profile is not None:
+            profile.record(state.time, frontier=len(infected), edges_examined=examined,
+                           edges_skipped=examined - tried, coin_flips=tried + jumps,
+                           random_jump_attempts=jumps,
+                           infections=len(state.infected) - n_infected)
 
     def step(self):
-        if not self.is_complete:
+        if not self.state.is_complete:
             self.__infect_step()
 
     def simulate(self):
-        while not self.is_complete:
+        while not self.state.is_complete:
             self.step()
-            self.time += 1
+            self.state.time += 1
 
     @property
     def size(self):
-        return len(self.infected)/float(self.graph.number_of_nodes())
+        return len(self.state.infected)/float(len(self.nodes))
 
     @property
     def length(self):
-        return self.time
+        return self.state.time
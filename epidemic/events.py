@@ -0,0 +1,178 @@
+import heapq
+import numpy as np
+
+from epidemic.csr import CSRGraph
+
+# Kinds of pending events
+INFECTION = 0
+RANDOM_JUMP = 1
+
+
+class EventSI(object):
+    """An event-driven SI epidemic model running on a `CSRGraph`.
+
+    Instead of sweeping the infected nodes step after step, every node
+    flips the coins of its out-edges once, when it gets infected, and each
+    edge that transmits schedules an infection event after a delay. Events
+    are processed in time order from a priority queue, and an event whose
+    target is already infected is dropped, so the cost grows with the
+    number of infections and the out-edges of infected nodes, not with the
+    number of steps.
+
+    With delay="generation" every delay is one step, and the epidemic
+    follows the same distribution as `SI`'s: each edge is tried once, the
+    step after its source is infected. With delay="exponential" the
+    delays are exponential with mean one step, so every infection time is
+    continuous; whether an edge transmits is decided as before, so the
+    size follows the same distribution too. `length` counts generations,
+    as in `SI`, and `duration` is the time of the last infection.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    p : transmission probability
+
+    is_random_jump : for each node u, if that node ever gets infected,
+        give it exactly n_random_jumps (see below) chance to jump to a random
+        node that is not reachable from u, after the same delay as an edge
+
+    random_jump_p : probability of a random jump (if is_random_jump is enabled)
+        happening
+
+    n_random_jumps : number of random jumps to try if is_random_jump enabled
+
+    delay : "generation" or "exponential", see above
+
+    rng : the `numpy.random.Generator` to draw from (see `epidemic.rng`),
+        by default a freshly seeded one
+
+    """
+    def __init__(self,
+                 graph,
+                 p=0.5,
+                 is_random_jump=False,
+                 random_jump_p=0.001,
+                 n_random_jumps=1,
+                 delay="generation",
+                 rng=None):
+        if delay not in ("generation", "exponential"):
+            raise ValueError("Unknown delay {0!r}: use \"generation\" or \"exponential\".".format(delay))
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph(graph)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.p = p
+        self.graph = graph
+        self.delay = delay
+        self.probabilities = graph.transmission_probabilities(p)
+        self.infected = np.zeros(graph.number_of_nodes(), dtype=bool)
+        self.is_random_jump = is_random_jump
+        if is_random_jump:
+            self.random_jump_p = random_jump_p
+            self.n_random_jumps = n_random_jumps
+        self.reset()
+
+    def reset(self, p=None, random_jump_p=None, rng=None):
+        """Clear the state of the previous run, optionally changing p,
+        random_jump_p or the random stream for the next one.
+
+        """
+        if rng is not None:
+            self.rng = rng
+        if p is not None and p != self.p:
+            self.p = p
+            self.probabilities = self.graph.transmission_probabilities(p)
+        if random_jump_p is not None:
+            self.random_jump_p = random_jump_p
+        self.infected[:] = False
+        self.n_infected = 0
+        # (time, kind, order scheduled, node, generation): at any one time,
+        # every infection is processed before the random jumps, as in `CSRSI`
+        self.events = []
+        self.n_scheduled = 0
+        self.generations = 0
+        self.duration = 0.0
+        self.timeline = []
+        self.is_complete = False
+
+    def infect_random_node(self):
+        susceptible = np.flatnonzero(~self.infected)
+        if len(susceptible) == 0:
+            print("No susceptible nodes to infect.")
+            return
+        self.schedule(0.0, INFECTION, self.rng.choice(susceptible), 0)
+
+    def infect_node(self, node):
+        """Infect a node, at time 0, if it is susceptible.
+
+        """
+        i = self.graph.index.get(node)
+        if i is not None:
+            self.schedule(0.0, INFECTION, i, 0)
+
+    def schedule(self, time, kind, i, generation):
+        heapq.heappush(self.events, (time, kind, self.n_scheduled, i, generation))
+        self.n_scheduled += 1
+        self.is_complete = False
+
+    def delays(self, n):
+        if self.delay == "generation":
+            return np.ones(n)
+        return self.rng.exponential(1.0, n)
+
+    def __infect(self, time, i, generation):
+        self.infected[i] = True
+        self.n_infected += 1
+        self.generations = max(self.generations, generation)
+        self.duration = max(self.duration, time)
+        if self.delay == "generation":
+            # As in `SI`, where a node infected during step t is
+            # recorded at time t, one less than its generation
+            self.timeline.append((self.graph.nodes[i], max(generation - 1, 0)))
+        else:
+            self.timeline.append((self.graph.nodes[i], time))
+
+        start, stop = self.graph.indptr[i], self.graph.indptr[i + 1]
+        targets = self.graph.indices[start:stop]
+        hits = targets[(self.rng.random(stop - start) <= self.probabilities[start:stop]) &
+                       ~self.infected[targets]]
+        for v, delay in zip(hits.tolist(), self.delays(len(hits)).tolist()):
+            self.schedule(time + delay, INFECTION, v, generation + 1)
+        if self.is_random_jump:
+            self.schedule(time + self.delays(1)[0], RANDOM_JUMP, i, generation + 1)
+
+    def __random_jump(self, time, u, generation):
+        candidates = np.flatnonzero(~(self.graph.reachability.reachable_mask(u) | self.infected))
+        if len(candidates) == 0:
+            return
+        n = min(int(self.n_random_jumps), len(candidates))
+        for v in self.rng.choice(candidates, n, replace=False):
+            if self.rng.random() <= self.random_jump_p:
+                # Lands when the jump is taken, as in `SI`, so that no
+                # other jump can pick the same node in the meantime
+                self.__infect(time, v, generation)
+
+    def step(self):
+        """Process the next event."""
+        if not self.events:
+            self.is_complete = True
+            return
+        (time, kind, _, i, generation) = heapq.heappop(self.events)
+        if kind == RANDOM_JUMP:
+            self.__random_jump(time, i, generation)
+        elif not self.infected[i]:
+            self.__infect(time, i, generation)
+
+    def simulate(self):
+        while self.events:
+            self.step()
+        self.is_complete = True
+
+    @property
+    def size(self):
+        return self.n_infected/float(self.graph.number_of_nodes())
+
+    @property
+    def length(self):
+        """Like `SI.length`: one more than the number of generations."""
+        return self.generations + 1
@@ -0,0 +1,105 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+from epidemic.csr import CSRGraph
+
+
+def is_deterministic(graph, p):
+    """Whether an SI epidemic at transmission probability `p` always ends
+    the same way on `graph` (a `CSRGraph`): every edge transmits with
+    probability p * weight of 0 or 1.
+
+    """
+    probabilities = graph.transmission_probabilities(p)
+    return bool(np.all((probabilities <= 0) | (probabilities >= 1)))
+
+
+def exact_outcome(graph, sources, p=0.5, is_random_jump=False, random_jump_p=0.001, n_random_jumps=1):
+    """The size and length of the SI epidemic from each source, if they do
+    not depend on chance.
+
+    That is the case when every edge transmits with probability 0 or 1
+    (see `is_deterministic`), e.g. for p=0 and for p=1 on unit weights,
+    and random jumps are off or have probability 0. The epidemic then
+    infects exactly the nodes reachable over the edges that always
+    transmit, and lasts one step more than the farthest of them is away
+    from the source. Found with one breadth-first search per source.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    sources : source node labels. Labels that are not in the graph give an
+        empty epidemic, like `SI.infect_node` does.
+
+    p, is_random_jump, random_jump_p, n_random_jumps : as for `CSRSI`
+
+    Returns
+    -------
+    {"size": array, "length": array}, indexed like `sources`, or None if
+    the outcome is random.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    if is_random_jump and random_jump_p > 0 and n_random_jumps > 0:
+        return None
+    if not is_deterministic(graph, p):
+        return None
+
+    n = graph.number_of_nodes()
+    ids = np.array([graph.index.get(node, -1) for node in sources], dtype=np.int64)
+    size = np.zeros(len(ids), dtype=np.float64)
+    length = np.ones(len(ids), dtype=np.int64)
+    valid = ids >= 0
+    if valid.any():
+        transmits = (graph.transmission_probabilities(p) >= 1).astype(np.int8)
+        matrix = csr_matrix((transmits, graph.indices, graph.indptr), shape=(n, n))
+        matrix.eliminate_zeros()
+        hops = shortest_path(matrix, directed=True, unweighted=True, indices=ids[valid])
+        reached = np.isfinite(hops)
+        size[valid] = reached.sum(axis=1) / float(n)
+        length[valid] = np.where(reached, hops, 0).max(axis=1).astype(np.int64) + 1
+    return {"size": size, "length": length}
+
+
+def exact_results(graph, nodes, values, n_trials, param="p", **kwargs):
+    """The trials of every swept value whose outcome does not depend on
+    chance (see `exact_outcome`), without simulating them.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    nodes : source nodes
+
+    values : values of the swept parameter
+
+    n_trials : number of (identical) trials to record per (value, node) pair
+
+    param : name of the `CSRSI` argument being swept
+
+    kwargs : other arguments passed to `CSRSI`
+
+    Returns
+    -------
+    {"size": {value: {node: [...]}}, "length": ...}, holding only the
+    values with a deterministic outcome.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    nodes = list(nodes)
+    results = {"size": {}, "length": {}}
+    for value in values:
+        value_kwargs = dict(kwargs)
+        value_kwargs[param] = value
+        outcome = exact_outcome(graph, nodes, **value_kwargs)
+        if outcome is None:
+            continue
+        results["size"][value] = dict((node, [size] * n_trials)
+                                      for node, size in zip(nodes, outcome["size"].tolist()))
+        results["length"][value] = dict((node, [length] * n_trials)
+                                        for node, length in zip(nodes, outcome["length"].tolist()))
+    return results
@@ -0,0 +1,98 @@
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+
+from epidemic.csr import CSRGraph
+from epidemic.exact import exact_outcome
+from epidemic.reachability import ReachabilityIndex
+
+
+def percolate(graph, p, rng):
+    """A bond-percolated copy of `graph` (a `CSRGraph`): every edge is kept,
+    independently, with its transmission probability p * weight.
+
+    """
+    coins = rng.random(graph.number_of_edges())
+    return graph.edge_subgraph(coins <= graph.transmission_probabilities(p))
+
+
+def reachable_counts(graph):
+    """Number of nodes reachable from every node of `graph` (a `CSRGraph`),
+    itself included, from the closure of its condensation.
+
+    """
+    index = ReachabilityIndex.build(graph)
+    component_sizes = np.bincount(index.labels, minlength=index.n_components)
+    reachable = np.unpackbits(index.closure, axis=1)[:, :index.n_components].astype(bool)
+    return reachable.dot(component_sizes)[index.labels]
+
+
+def simulate_percolation(graph, sources, ps, n_trials, lengths=True, rng=None):
+    """Estimate SI epidemics by percolation.
+
+    In `SI`, every edge is tried at most once, and transmits with
+    probability p * weight, so the nodes an epidemic ends up infecting are
+    those reachable from its source in a graph where each edge is kept
+    with that probability. Each trial samples one such graph and reads the
+    size of the epidemic from every source off the closure of its
+    condensation at once. The length is one more than the distance to the
+    farthest node reached, found with a breadth-first search per source.
+    The results follow the same distribution as `SI.simulate()`'s, but
+    the epidemics of different sources in the same trial share their
+    graph, so they are not independent. Transmission probabilities whose
+    outcome does not depend on chance, like p=0 and p=1, are filled in by
+    `exact_outcome` instead of being simulated.
+
+    Random jumps are not modelled.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    sources : node labels to start the epidemics from. Labels that are not
+        in the graph give an empty epidemic, like `SI.infect_node` does.
+
+    ps : transmission probabilities
+
+    n_trials : number of percolated graphs per transmission probability
+
+    lengths : whether to find the lengths as well (the sizes alone only
+        need the condensation)
+
+    rng : the `numpy.random.Generator` to draw from (see `epidemic.rng`),
+        by default a freshly seeded one
+
+    Returns
+    -------
+    A dict with "size" and "length" arrays of shape
+    (len(ps), len(sources), n_trials), like `simulate_batch`. "length" is
+    None if lengths=False.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    if rng is None:
+        rng = np.random.default_rng()
+    n = graph.number_of_nodes()
+    ids = np.array([graph.index.get(node, -1) for node in sources], dtype=np.int64)
+    valid = ids >= 0
+
+    shape = (len(ps), len(ids), n_trials)
+    sizes = np.zeros(shape, dtype=np.float64)
+    length = np.ones(shape, dtype=np.int64) if lengths else None
+    for i, p in enumerate(ps):
+        outcome = exact_outcome(graph, sources, p)
+        if outcome is not None:
+            sizes[i] = outcome["size"][:, np.newaxis]
+            if lengths:
+                length[i] = outcome["length"][:, np.newaxis]
+            continue
+        for trial in range(n_trials):
+            percolated = percolate(graph, p, rng)
+            sizes[i, valid, trial] = reachable_counts(percolated)[ids[valid]] / float(n)
+            if lengths and valid.any():
+                hops = shortest_path(percolated.to_scipy(), directed=True, unweighted=True,
+                                     indices=ids[valid])
+                farthest = np.where(np.isfinite(hops), hops, 0).max(axis=1)
+                length[i, valid, trial] = farthest.astype(np.int64) + 1
+
+    return {"size": sizes, "length": length}
@@ -0,0 +1,96 @@
+import numpy as np
+
+# What `SI` and `CSRSI` count in every step of a profiled run
+COUNTERS = ("frontier",              # nodes whose out-edges were enumerated
+            "edges_examined",        # out-edges of those nodes
+            "edges_skipped",         # of which already tried, or to infected nodes
+            "coin_flips",            # transmission and random jump coins drawn
+            "random_jump_attempts",  # random jump targets picked
+            "infections")            # nodes infected
+# The parts of a step whose wall time is measured
+PHASES = ("copy", "edges", "random_jump")
+
+
+class Profile(object):
+    """Per-step counters and phase timings of profiled SI runs.
+
+    Pass one as the `profile` of `SI`, `CSRSI`, `run_sweep` or
+    `run_adaptive_sweep` and it accumulates over every run. The counters
+    are summed by step number (the epidemic's `time` when the step ran),
+    so profiles of different runs, processes or sweeps merge exactly with
+    `merge`. Engines without a profile do not count anything.
+
+    """
+    def __init__(self):
+        self.n_runs = 0
+        self.counts = dict((counter, np.zeros(0, dtype=np.int64)) for counter in COUNTERS)
+        self.seconds = dict((phase, 0.0) for phase in PHASES)
+
+    @property
+    def n_steps(self):
+        return len(self.counts["frontier"])
+
+    def _grow(self, n_steps):
+        extra = n_steps - self.n_steps
+        if extra > 0:
+            for counter in COUNTERS:
+                self.counts[counter] = np.concatenate(
+                    (self.counts[counter], np.zeros(extra, dtype=np.int64)))
+
+    def record(self, time, **counts):
+        """Add the counts of the step run at `time`. The first step of a
+        run (time 0) starts a new run.
+
+        """
+        if time == 0:
+            self.n_runs += 1
+        self._grow(time + 1)
+        for counter, count in counts.items():
+            self.counts[counter][time] += count
+
+    def add_time(self, phase, seconds):
+        self.seconds[phase] += seconds
+
+    def merge(self, other):
+        """Add the runs of `other` to this profile, in place."""
+        self.n_runs += other.n_runs
+        self._grow(other.n_steps)
+        for counter in COUNTERS:
+            self.counts[counter][:other.n_steps] += other.counts[counter]
+        for phase in PHASES:
+            self.seconds[phase] += other.seconds[phase]
+        return self
+
+    def totals(self):
+        return dict((counter, int(self.counts[counter].sum())) for counter in COUNTERS)
+
+    def report(self, max_steps=20):
+        """A text table of the totals, the time spent in each phase, and
+        the mean of every counter per run at each of the first `max_steps`
+        steps.
+
+        """
+        totals = self.totals()
+        lines = ["{0} runs of up to {1} steps".format(self.n_runs, self.n_steps)]
+        lines.append("")
+        lines.append("{0:<22}{1:>16}{2:>16}".format("counter", "total", "per run"))
+        for counter in COUNTERS:
+            lines.append("{0:<22}{1:>16d}{2:>16.2f}".format(
+                counter, totals[counter], totals[counter] / float(max(self.n_runs, 1))))
+
+        lines.append("")
+        total_seconds = sum(self.seconds.values())
+        lines.append("{0:<22}{1:>16}{2:>16}".format("phase", "seconds", "share"))
+        for phase in PHASES:
+            share = self.seconds[phase] / total_seconds if total_seconds > 0 else 0.0
+            lines.append("{0:<22}{1:>16.4f}{2:>15.1f}%".format(phase, self.seconds[phase], 100 * share))
+
+        lines.append("")
+        lines.append("{0:<6}".format("step") + "".join("{0:>22}".format(c) for c in COUNTERS))
+        for time in range(min(self.n_steps, max_steps)):
+            lines.append("{0:<6d}".format(time) + "".join(
+                "{0:>22.2f}".format(self.counts[c][time] / float(max(self.n_runs, 1)))
+                for c in COUNTERS))
+        if self.n_steps > max_steps:
+            lines.append("... {0} more steps".format(self.n_steps - max_steps))
+        return "\n".join(lines)
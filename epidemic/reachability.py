@@ -0,0 +1,129 @@
+import os
+import tempfile
+import zipfile
+import numpy as np
+from collections import deque
+from scipy.sparse.csgraph import connected_components
+
+CACHE_DIR = "cache/graphs"
+
+# Indices already loaded by this process, by graph content hash
+_loaded = {}
+
+
+def save_atomically(path, write):
+    """Write a cache file through `write(f)` to a temporary file next to
+    `path`, then move it into place, so that other processes reading the
+    cache never see it half-written.
+
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(dir=directory or ".", suffix=".tmp", delete=False)
+    try:
+        with f:
+            write(f)
+        os.replace(f.name, path)
+    except BaseException:
+        if os.path.exists(f.name):
+            os.remove(f.name)
+        raise
+
+
+class ReachabilityIndex(object):
+    """Which nodes of a graph can be reached from which.
+
+    The graph is condensed into its strongly connected components, and the
+    transitive closure of the condensation is stored as one packed bit row
+    per component: bit d of row c is set if component d can be reached from
+    component c (every component reaches itself).
+
+    Parameters
+    ----------
+    labels : component of every node, indexed by node id
+
+    closure : packed closure, of shape (n_components, ceil(n_components/8))
+
+    """
+    def __init__(self, labels, closure):
+        self.labels = labels
+        self.closure = closure
+        self.n_components = len(closure)
+
+    @classmethod
+    def build(cls, graph):
+        """Condense `graph` (a `CSRGraph`) and compute its closure.
+
+        """
+        n_components, labels = connected_components(graph.to_scipy(), directed=True,
+                                                    connection='strong')
+        sources = np.repeat(labels, np.diff(graph.indptr))
+        targets = labels[graph.indices]
+        between = sources != targets
+        edges = np.unique(sources[between] * n_components + targets[between])
+        sources, targets = edges // n_components, edges % n_components
+
+        # Topological order of the condensation (Kahn's algorithm)
+        indptr = np.zeros(n_components + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_components), out=indptr[1:])
+        in_degree = np.bincount(targets, minlength=n_components)
+        queue = deque(np.flatnonzero(in_degree == 0))
+        order = []
+        while queue:
+            c = queue.popleft()
+            order.append(c)
+            for d in targets[indptr[c]:indptr[c + 1]]:
+                in_degree[d] -= 1
+                if in_degree[d] == 0:
+                    queue.append(d)
+
+        # Sinks first, so every successor's row is final when it is used
+        closure = np.zeros((n_components, (n_components + 7) // 8), dtype=np.uint8)
+        for c in reversed(order):
+            closure[c, c // 8] |= np.uint8(128 >> (c % 8))
+            for d in targets[indptr[c]:indptr[c + 1]]:
+                closure[c] |= closure[d]
+        return cls(labels, closure)
+
+    @classmethod
+    def of(cls, graph, cache_dir=CACHE_DIR):
+        """The index of `graph` (a `CSRGraph`), keyed by its content hash.
+
+        Indices are kept in memory for the life of the process, and read
+        from (or saved to) `cache_dir`. Pass cache_dir=None to skip the disk.
+
+        """
+        key = graph.content_hash()
+        if key in _loaded:
+            return _loaded[key]
+
+        path = None if cache_dir is None else \
+            os.path.join(cache_dir, "reachability-{0}.npz".format(key))
+        index = None
+        if path is not None and os.path.exists(path):
+            try:
+                with np.load(path) as cached:
+                    index = cls(cached["labels"], cached["closure"])
+            except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+                # Unreadable, e.g. left half-written by a crash: rebuild it
+                index = None
+        if index is None:
+            index = cls.build(graph)
+            if path is not None:
+                save_atomically(path, lambda f: np.savez(f, labels=index.labels, closure=index.closure))
+
+        _loaded[key] = index
+        return index
+
+    def reachable_mask(self, u):
+        """Boolean mask of the nodes reachable from node id `u`.
+
+        Also marks u's own component, so it includes u itself.
+
+        """
+        row = np.unpackbits(self.closure[self.labels[u]])[:self.n_components]
+        return row.astype(bool)[self.labels]
+
+    def unreachable_mask(self, u):
+        return ~self.reachable_mask(u)
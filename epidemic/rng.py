@@ -0,0 +1,36 @@
+import zlib
+import numpy as np
+
+
+def key_of(part):
+    """A non-negative integer standing for one part of a stream key: a
+    name, a probability or a node label.
+
+    """
+    if isinstance(part, (str, bytes)):
+        if not isinstance(part, bytes):
+            part = part.encode("utf-8")
+        return zlib.crc32(part) & 0xffffffff
+    if isinstance(part, (float, np.floating)):
+        # The bits of the float, so that e.g. 0.1 and 0.1000001 differ
+        return int(np.float64(part).view(np.uint64))
+    return int(part) % 2**64
+
+
+def stream(seed, *key):
+    """A `numpy.random.Generator` on its own Philox stream.
+
+    The stream depends only on `seed` and `key`, e.g. (department, p,
+    source, trial), so any one run of a sweep can be regenerated exactly,
+    and streams with different keys are independent whichever process
+    draws from them.
+
+    Parameters
+    ----------
+    seed : root seed, an integer (None draws a fresh one)
+
+    key : names, probabilities and integers identifying the stream
+
+    """
+    sequence = np.random.SeedSequence(seed, spawn_key=tuple(key_of(part) for part in key))
+    return np.random.Generator(np.random.Philox(sequence))
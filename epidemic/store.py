@@ -0,0 +1,370 @@
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+from datetime import datetime
+from collections import defaultdict
+
+MANIFEST = "manifest.json"
+
+
+def store_path_of(cache_dir):
+    """The store directory standing in for a pickle path like "cache/CS_SI.p".
+
+    """
+    if cache_dir.endswith(".p"):
+        return cache_dir[:-len(".p")]
+    return cache_dir
+
+
+def arrays_of_results(results):
+    """Flatten {"size": {p: {node: [...]}}, "length": ...} into one row per
+    trial.
+
+    """
+    ps = []; nodes = []; sizes = []; lengths = []
+    for p, by_node in results["size"].items():
+        for node, trials in by_node.items():
+            ps.extend([p] * len(trials))
+            nodes.extend([node] * len(trials))
+            sizes.extend(trials)
+            lengths.extend(results["length"][p][node])
+    return {"p": np.array(ps, dtype=np.float64),
+            "node": np.array(nodes, dtype=np.int64),
+            "size": np.array(sizes, dtype=np.float32),
+            "length": np.array(lengths, dtype=np.uint16)}
+
+
+def results_of_arrays(arrays):
+    """The inverse of `arrays_of_results`, keeping the order of the trials.
+
+    """
+    results = {"size": defaultdict(lambda: defaultdict(list)),
+               "length": defaultdict(lambda: defaultdict(list))}
+    rows = zip(arrays["p"].tolist(), arrays["node"].tolist(),
+               arrays["size"].tolist(), arrays["length"].tolist())
+    for (p, node, size, length) in rows:
+        results["size"][p][node].append(size)
+        results["length"][p][node].append(length)
+    return results
+
+
+def _add_counts(header, arrays):
+    """Count the trials in `arrays` into the header's (p, node) grid,
+    growing the grid as needed.
+
+    """
+    ps = sorted(set(header["ps"]) | set(arrays["p"].tolist()))
+    nodes = sorted(set(header["nodes"]) | set(arrays["node"].tolist()))
+    counts = np.zeros((len(ps), len(nodes)), dtype=np.int64)
+    if header["counts"]:
+        rows = np.searchsorted(ps, header["ps"])
+        columns = np.searchsorted(nodes, header["nodes"])
+        counts[np.ix_(rows, columns)] = header["counts"]
+    np.add.at(counts, (np.searchsorted(ps, arrays["p"]), np.searchsorted(nodes, arrays["node"])), 1)
+    header["ps"], header["nodes"], header["counts"] = ps, nodes, counts.tolist()
+
+
+class Results(object):
+    """Epidemic results as dense arrays.
+
+    `size` and `length` have shape (n_p, n_nodes, n_trials). Cell (i, j)
+    holds counts[i, j] trials, for ps[i] and source nodes[j], and is padded
+    with zeros past that.
+
+    """
+    def __init__(self, ps, nodes, size, length, counts):
+        self.ps = ps
+        self.nodes = nodes
+        self.size = size
+        self.length = length
+        self.counts = counts
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Build from one row per trial (see `arrays_of_results`), keeping
+        the order of the trials within each cell.
+
+        """
+        ps, p_index = np.unique(arrays["p"], return_inverse=True)
+        nodes, node_index = np.unique(arrays["node"], return_inverse=True)
+        cells = p_index * len(nodes) + node_index
+        counts = np.bincount(cells, minlength=len(ps) * len(nodes))
+
+        order = np.argsort(cells, kind='mergesort')
+        starts = np.cumsum(counts) - counts
+        trial = np.empty(len(cells), dtype=np.int64)
+        trial[order] = np.arange(len(cells)) - np.repeat(starts, counts)
+
+        shape = (len(ps), len(nodes), counts.max() if len(counts) else 0)
+        size = np.zeros(shape, dtype=np.float32)
+        length = np.zeros(shape, dtype=np.uint16)
+        size[p_index, node_index, trial] = arrays["size"]
+        length[p_index, node_index, trial] = arrays["length"]
+        return cls(ps.tolist(), nodes.tolist(), size, length,
+                   counts.reshape(len(ps), len(nodes)))
+
+    @classmethod
+    def from_dict(cls, results):
+        return cls.from_arrays(arrays_of_results(results))
+
+    def to_arrays(self):
+        """One row per trial, in (p, node, trial) order.
+
+        """
+        valid = np.arange(self.size.shape[2]) < self.counts[:, :, np.newaxis]
+        i, j, _ = np.nonzero(valid)
+        return {"p": np.asarray(self.ps, dtype=np.float64)[i],
+                "node": np.asarray(self.nodes, dtype=np.int64)[j],
+                "size": np.asarray(self.size[valid], dtype=np.float32),
+                "length": np.asarray(self.length[valid], dtype=np.uint16)}
+
+    def mean(self, kind):
+        """Average "size" or "length" of every (p, node) cell, an array of
+        shape (n_p, n_nodes) that is NaN for cells without trials.
+
+        """
+        values = getattr(self, kind)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return values.sum(axis=2, dtype=np.float64) / self.counts
+
+
+class ResultsStore(object):
+    """An append-only store of epidemic runs, kept in a directory.
+
+    Each batch of trials is written as a new shard: an .npz file with one
+    row per trial holding its transmission probability (or jump
+    probability), source node, size and length. A shard only becomes part
+    of the store once it is listed in the manifest, which is replaced
+    atomically, so a crash mid-write leaves the store as it was after the
+    last completed shard.
+
+    The manifest doubles as the store's header: besides the shards it
+    records the p grid, the node ids, the number of trials of every
+    (p, node) cell, the hash of the graph the epidemics ran on, the seed
+    and time of every batch, so progress can be checked without reading
+    any results.
+
+    `compact` merges the shards into a dense base: size.npy (float32) and
+    length.npy (uint16) arrays of shape (n_p, n_nodes, n_trials), with a
+    small header.json giving the p grid, the node ids and the trial count
+    of every cell. The base is read back memory-mapped, so it is never
+    loaded whole.
+
+    Parameters
+    ----------
+    path : the store's directory, e.g. "cache/CS_SI"
+
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _manifest(self):
+        manifest = {"kind": "trials", "base": None, "shards": [], "next_shard": 0,
+                    "ps": [], "nodes": [], "counts": [],
+                    "graph_hash": None, "history": [], "created": None, "updated": None}
+        try:
+            with open(os.path.join(self.path, MANIFEST)) as f:
+                manifest.update(json.load(f))
+        except IOError:
+            pass
+        return manifest
+
+    def _write_atomically(self, name, write):
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, os.path.join(self.path, name))
+
+    def _write_manifest(self, manifest):
+        self._write_atomically(MANIFEST, lambda f: f.write(json.dumps(manifest, indent=4).encode("utf-8")))
+
+    def _write_shard(self, manifest, arrays):
+        name = "shard-{0:06d}.npz".format(manifest["next_shard"])
+        self._write_atomically(name, lambda f: np.savez(f, **arrays))
+        manifest["next_shard"] += 1
+        return name
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, MANIFEST))
+
+    @property
+    def shards(self):
+        return self._manifest()["shards"]
+
+    def header(self):
+        """The manifest, with `counts` as an (n_p, n_nodes) array, or None
+        if the store does not exist.
+
+        """
+        if not self.exists():
+            return None
+        header = self._manifest()
+        header["counts"] = np.array(header["counts"], dtype=np.int64).reshape(
+            len(header["ps"]), len(header["nodes"]))
+        return header
+
+    def append(self, results, seed=None, graph_hash=None):
+        """Add a batch of trials, {"size": {p: {node: [...]}}, "length": ...},
+        as a new shard. Returns the shard's name, or None if the batch is
+        empty.
+
+        Parameters
+        ----------
+        seed : the seed the batch was generated with, if any
+
+        graph_hash : `CSRGraph.content_hash()` of the graph the batch ran on.
+            Every batch of a store must come from the same graph.
+
+        """
+        arrays = arrays_of_results(results)
+        if len(arrays["p"]) == 0:
+            return None
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        manifest = self._manifest()
+        if manifest["kind"] != "trials":
+            raise ValueError("{0} only keeps a summary; use a SummaryStore.".format(self.path))
+        if graph_hash is not None:
+            if manifest["graph_hash"] not in (None, graph_hash):
+                raise ValueError("{0} holds runs on graph {1}, not {2}.".format(
+                    self.path, manifest["graph_hash"], graph_hash))
+            manifest["graph_hash"] = graph_hash
+
+        name = self._write_shard(manifest, arrays)
+        now = datetime.utcnow().isoformat()
+        manifest["shards"].append(name)
+        _add_counts(manifest, arrays)
+        manifest["history"].append({"shard": name, "trials": len(arrays["p"]),
+                                    "seed": seed, "time": now})
+        manifest["created"] = manifest["created"] or now
+        manifest["updated"] = now
+        self._write_manifest(manifest)
+        return name
+
+    def _read_base(self, name):
+        directory = os.path.join(self.path, name)
+        with open(os.path.join(directory, "header.json")) as f:
+            header = json.load(f)
+        return Results(header["ps"], header["nodes"],
+                       np.load(os.path.join(directory, "size.npy"), mmap_mode='r'),
+                       np.load(os.path.join(directory, "length.npy"), mmap_mode='r'),
+                       np.array(header["counts"], dtype=np.int64))
+
+    def _write_base(self, manifest, results):
+        name = "base-{0:06d}".format(manifest["next_shard"])
+        directory = os.path.join(self.path, name + ".tmp")
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "size.npy"), results.size)
+        np.save(os.path.join(directory, "length.npy"), results.length)
+        with open(os.path.join(directory, "header.json"), "w") as f:
+            json.dump({"ps": results.ps, "nodes": results.nodes,
+                       "counts": results.counts.tolist()}, f)
+        os.rename(directory, os.path.join(self.path, name))
+        manifest["next_shard"] += 1
+        return name
+
+    def read(self, fields=("p", "node", "size", "length")):
+        """Every trial in the store, as arrays with one row per trial.
+
+        """
+        manifest = self._manifest()
+        if manifest["kind"] != "trials":
+            raise ValueError("{0} only keeps a summary of its trials.".format(self.path))
+        columns = dict((field, []) for field in fields)
+        if manifest.get("base"):
+            base = self._read_base(manifest["base"]).to_arrays()
+            for field in fields:
+                columns[field].append(base[field])
+        for name in manifest["shards"]:
+            with np.load(os.path.join(self.path, name)) as shard:
+                for field in fields:
+                    columns[field].append(shard[field])
+        empty = arrays_of_results({"size": {}, "length": {}})
+        return dict((field, np.concatenate(columns[field]) if columns[field] else empty[field])
+                    for field in fields)
+
+    def results(self):
+        """Every trial in the store, as `Results`.
+
+        Memory-mapped straight from the base when there are no shards
+        waiting to be compacted.
+
+        """
+        manifest = self._manifest()
+        if manifest.get("base") and not manifest["shards"]:
+            return self._read_base(manifest["base"])
+        return Results.from_arrays(self.read())
+
+    def load(self):
+        """Every trial in the store, as {"size": {p: {node: [...]}}, "length": ...}.
+
+        """
+        return results_of_arrays(self.read())
+
+    def n_trials(self, ps, nodes):
+        """The fewest trials stored for any (p, node) pair of the grid.
+
+        """
+        header = self.header()
+        if header is None:
+            return 0
+        p_index = dict((p, i) for i, p in enumerate(header["ps"]))
+        node_index = dict((node, j) for j, node in enumerate(header["nodes"]))
+        counts = [header["counts"][p_index[float(p)], node_index[node]]
+                  if float(p) in p_index and node in node_index else 0
+                  for p in ps for node in nodes]
+        return int(min(counts or [0]))
+
+    def _remove_unreferenced(self, manifest):
+        """Remove what an interrupted `compact` or `append` left behind:
+        bases and shards the manifest does not list, and temporary files.
+
+        """
+        keep = set(manifest["shards"]) | set([manifest.get("base")])
+        for name in os.listdir(self.path):
+            if name in keep or not (name.startswith("base-") or name.startswith("shard-") or
+                                    name.endswith(".tmp")):
+                continue
+            path = os.path.join(self.path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def compact(self):
+        """Merge the base and every shard into a new base.
+
+        The new base only replaces the old one once the manifest lists it,
+        so a crash at any point leaves the store readable as it was, and
+        the next `compact` clears whatever the interrupted one wrote.
+
+        """
+        manifest = self._manifest()
+        if not manifest["shards"]:
+            return
+        # A base renamed into place just before a crash may bear the name
+        # the new one is about to take
+        self._remove_unreferenced(manifest)
+        manifest["base"] = self._write_base(manifest, Results.from_arrays(self.read()))
+        manifest["shards"] = []
+        self._write_manifest(manifest)
+        self._remove_unreferenced(manifest)
+
+def load_results(cache_dir):
+    """Load the results for a cache path like "cache/CS_SI.p", as `Results`.
+
+    Reads the `ResultsStore` next to it if there is one, and falls back to
+    the pickle otherwise.
+
+    """
+    store = ResultsStore(store_path_of(cache_dir))
+    if store.exists():
+        return store.results()
+    with open(cache_dir, 'rb') as f:
+        # The caches were pickled by Python 2, whose byte strings (such as
+        # the data of numpy scalars) only decode as latin-1
+        return Results.from_dict(pickle.load(f, encoding='latin1'))
@@ -0,0 +1,344 @@
+import itertools
+import numpy as np
+from collections import defaultdict
+from multiprocessing import Pool
+from scipy.stats import norm
+
+from epidemic.accumulate import Accumulator
+from epidemic.csr import CSRGraph, CSRSI
+from epidemic.exact import exact_outcome
+from epidemic.profile import Profile
+from epidemic.rng import stream
+
+# The graph a worker process simulates on, set once by `_init_worker`
+_graph = None
+
+
+def _init_worker(graph):
+    global _graph
+    _graph = graph
+
+
+def _run_task(task):
+    (key, source, first_trial, n_trials, kwargs, seed, prefix, profiled) = task
+    # Every trial gets its own stream, keyed by what it simulates, so the
+    # results do not depend on which worker runs it or in which order
+    sizes = []; lengths = []
+    profile = Profile() if profiled else None
+    epi = CSRSI(_graph, profile=profile, **kwargs)
+    for trial in range(first_trial, first_trial + n_trials):
+        epi.reset(rng=stream(seed, *(prefix + (source, trial))))
+        epi.infect_node(source)
+        epi.simulate()
+        sizes.append(epi.size)
+        lengths.append(epi.length)
+    return (key, sizes, lengths, profile)
+
+
+def empty_results(values):
+    results = {"size": {}, "length": {}}
+    for value in values:
+        results["size"][value] = defaultdict(list)
+        results["length"][value] = defaultdict(list)
+    return results
+
+
+def merge_results(results, new):
+    """Append the trials in `new` to `results`, in place.
+
+    Both are {"size": {p: {node: [...]}}, "length": ...} dicts.
+
+    """
+    for kind in new:
+        for value, by_node in new[kind].items():
+            for node, trials in by_node.items():
+                results[kind][value][node].extend(trials)
+    return results
+
+
+def run_sweep(graph,
+              nodes,
+              values,
+              n_trials,
+              param="p",
+              processes=None,
+              chunk_size=50,
+              seed=None,
+              name=None,
+              profile=None,
+              **kwargs):
+    """Run SI epidemics for every (value, source node) pair on a process pool.
+
+    The (value, node, trial chunk) grid is split into tasks, and the
+    compiled graph is sent to each worker once, when the pool starts. Every
+    trial draws from its own `epidemic.rng.stream`, keyed by (name, value,
+    node, trial), so a sweep gives the same results for any number of
+    processes and any one trial can be rerun on its own. Values
+    whose outcome does not depend on chance, like p=0 and p=1, are
+    filled in by `exact_outcome` instead of being simulated.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    nodes : source nodes
+
+    values : values of the swept parameter
+
+    n_trials : number of epidemics per (value, node) pair
+
+    param : name of the `CSRSI` argument being swept, e.g. "p" or
+        "random_jump_p"
+
+    processes : number of worker processes (defaults to the CPU count)
+
+    chunk_size : number of trials per task
+
+    seed : root seed of the sweep (None draws a fresh one)
+
+    name : a name to key the streams with as well, e.g. the department's
+
+    profile : an `epidemic.profile.Profile` to merge the step counters
+        of every simulated trial into (None to not count them)
+
+    kwargs : other arguments passed to `CSRSI`
+
+    Returns
+    -------
+    {"size": {value: {node: [...]}}, "length": ...}, the same layout as
+    the caches written by the update*results.py files.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    nodes = list(nodes)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    tasks = []; exact = {}
+    for i, value in enumerate(values):
+        task_kwargs = dict(kwargs)
+        task_kwargs[param] = value
+        outcome = exact_outcome(graph, nodes, **task_kwargs)
+        for j, node in enumerate(nodes):
+            if outcome is not None:
+                # Nothing to simulate, e.g. for p=0 or p=1
+                exact[(i, j, 0)] = ([float(outcome["size"][j])] * n_trials,
+                                    [int(outcome["length"][j])] * n_trials)
+                continue
+            for k, start in enumerate(range(0, n_trials, chunk_size)):
+                n = min(chunk_size, n_trials - start)
+                tasks.append(((i, j, k), node, start, n, task_kwargs, seed,
+                              _prefix(name, value), profile is not None))
+
+    if kwargs.get("is_random_jump"):
+        # Built once here, and sent to the workers with the graph
+        graph.reachability
+    pool = Pool(processes, initializer=_init_worker, initargs=(graph,))
+    try:
+        chunks = _run_tasks(pool, tasks, profile)
+    finally:
+        pool.close()
+        pool.join()
+    chunks.update(exact)
+
+    results = empty_results(values)
+    _merge_chunks(results, chunks, values, nodes)
+    return results
+
+
+def _prefix(name, value):
+    return (value,) if name is None else (name, value)
+
+
+def _run_tasks(pool, tasks, profile=None):
+    chunks = {}
+    for (key, sizes, lengths, task_profile) in pool.imap_unordered(_run_task, tasks):
+        chunks[key] = (sizes, lengths)
+        if profile is not None:
+            profile.merge(task_profile)
+    return chunks
+
+
+def _merge_chunks(results, chunks, values, nodes):
+    # Merge in grid order, whatever order the tasks finished in
+    for key in sorted(chunks.keys()):
+        sizes, lengths = chunks[key]
+        results["size"][values[key[0]]][nodes[key[1]]].extend(sizes)
+        results["length"][values[key[0]]][nodes[key[1]]].extend(lengths)
+
+
+def run_adaptive_sweep(graph,
+                       nodes,
+                       values,
+                       target_se,
+                       max_trials,
+                       min_trials=30,
+                       budget=None,
+                       confidence=0.95,
+                       param="p",
+                       processes=None,
+                       chunk_size=50,
+                       seed=None,
+                       name=None,
+                       prior=None,
+                       profile=None,
+                       **kwargs):
+    """Run SI epidemics for every (value, source node) pair until the
+    standard error of each pair's mean size is at most `target_se`.
+
+    The sweep runs in rounds on a process pool, like `run_sweep`. Every
+    pair first gets `min_trials` trials. After each round, the sample
+    variance of a pair that is still above the target gives the number
+    of trials it needs, var / target_se**2. At most that many more trials
+    are run, capped at `max_trials` in total and at doubling the pair's
+    trials per round, so the budget goes where the variance is highest.
+    Pairs with no variance stop after `min_trials`; those of values whose
+    outcome does not depend on chance, like p=0 and p=1, are filled in by
+    `exact_outcome` instead of being simulated.
+
+    Parameters
+    ----------
+    graph : a `CSRGraph`, or a networkx graph to compile
+
+    nodes : source nodes
+
+    values : values of the swept parameter
+
+    target_se : standard error of the mean size to reach in every pair
+
+    max_trials : most trials to run for any pair
+
+    min_trials : fewest trials to run for any pair, before its variance is
+        trusted
+
+    budget : most new trials to run in total (None for no limit). When
+        the remaining budget cannot cover a round, it goes to the pairs
+        with the highest variance first.
+
+    confidence : confidence level of the reported intervals
+
+    param : name of the `CSRSI` argument being swept
+
+    processes, chunk_size, seed, name, profile : as for `run_sweep`. The
+        new trials of a pair are numbered on from its prior trials.
+
+    prior : trials already run, {"size": {value: {node: [...]}}, ...}, which
+        count towards every limit (e.g. `ResultsStore.load()`), or their
+        `Accumulator` (e.g. `SummaryStore.load()`)
+
+    kwargs : other arguments passed to `CSRSI`
+
+    Returns
+    -------
+    (results, intervals): the new trials, in the layout of `run_sweep`,
+    and {value: {node: {"n", "mean", "se", "low", "high"}}} describing the
+    mean size of every pair over the prior and new trials.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    nodes = list(nodes)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    # A variance needs two trials
+    min_trials = max(min_trials, 2)
+
+    shape = (len(values), len(nodes))
+    n = np.zeros(shape, dtype=np.int64)
+    total = np.zeros(shape)
+    total_sq = np.zeros(shape)
+
+    def add(i, j, sizes):
+        sizes = np.asarray(sizes, dtype=np.float64)
+        n[i, j] += len(sizes)
+        total[i, j] += sizes.sum()
+        total_sq[i, j] += np.square(sizes).sum()
+
+    if isinstance(prior, Accumulator):
+        for i, value in enumerate(values):
+            for j, node in enumerate(nodes):
+                if float(value) in prior.ps and node in prior.nodes:
+                    cell = (prior.ps.index(float(value)), prior.nodes.index(node))
+                    count, mean = prior.counts[cell], prior.means["size"][cell]
+                    n[i, j] += count
+                    total[i, j] += count * mean
+                    total_sq[i, j] += prior.m2["size"][cell] + count * mean * mean
+    elif prior is not None:
+        for i, value in enumerate(values):
+            for j, node in enumerate(nodes):
+                add(i, j, prior["size"].get(value, {}).get(node, []))
+
+    def variance():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / n
+            return np.where(n > 1, np.maximum(total_sq - n * mean * mean, 0) / (n - 1), np.nan)
+
+    value_kwargs = []; outcomes = []
+    for value in values:
+        value_kwargs.append(dict(kwargs))
+        value_kwargs[-1][param] = value
+        outcomes.append(exact_outcome(graph, nodes, **value_kwargs[-1]))
+
+    results = empty_results(values)
+    remaining = np.inf if budget is None else budget
+    if kwargs.get("is_random_jump"):
+        # Built once here, and sent to the workers with the graph
+        graph.reachability
+    pool = Pool(processes, initializer=_init_worker, initargs=(graph,))
+    try:
+        for r in itertools.count():
+            var = variance()
+            with np.errstate(invalid='ignore'):
+                needed = np.where(n < min_trials, min_trials - n,
+                                  np.ceil(np.nan_to_num(var) / target_se ** 2) - n)
+                needed[(n >= min_trials) & ~(np.sqrt(var / n) > target_se)] = 0
+            most = np.maximum(np.minimum(max_trials - n, np.maximum(n, min_trials)), 0)
+            needed = np.clip(needed, 0, most).astype(np.int64)
+
+            if needed.sum() > remaining:
+                # Highest variance first
+                order = np.argsort(-np.where(np.isnan(var), np.inf, var), axis=None, kind='mergesort')
+                flat = needed.ravel()[order]
+                before = np.cumsum(flat) - flat
+                allotted = np.clip(remaining - before, 0, flat).astype(np.int64)
+                needed = np.zeros(needed.size, dtype=np.int64)
+                needed[order] = allotted
+                needed = needed.reshape(shape)
+            if needed.sum() == 0:
+                break
+            remaining -= needed.sum()
+
+            tasks = []; exact = {}
+            for i, j in zip(*np.nonzero(needed)):
+                i, j, count = int(i), int(j), int(needed[i, j])
+                if outcomes[i] is not None:
+                    exact[(i, j, r, 0)] = ([float(outcomes[i]["size"][j])] * count,
+                                           [int(outcomes[i]["length"][j])] * count)
+                    continue
+                for k, start in enumerate(range(0, count, chunk_size)):
+                    tasks.append(((i, j, r, k), nodes[j], int(n[i, j]) + start,
+                                  min(chunk_size, count - start), value_kwargs[i], seed,
+                                  _prefix(name, values[i]), profile is not None))
+            chunks = _run_tasks(pool, tasks, profile)
+            chunks.update(exact)
+            for key in sorted(chunks.keys()):
+                add(key[0], key[1], chunks[key][0])
+            _merge_chunks(results, chunks, values, nodes)
+    finally:
+        pool.close()
+        pool.join()
+
+    z = norm.ppf(0.5 + confidence / 2.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        se = np.sqrt(variance() / n)
+    intervals = {}
+    for i, value in enumerate(values):
+        intervals[value] = {}
+        for j, node in enumerate(nodes):
+            intervals[value][node] = {"n": int(n[i, j]), "mean": float(mean[i, j]),
+                                      "se": float(se[i, j]),
+                                      "low": float(mean[i, j] - z * se[i, j]),
+                                      "high": float(mean[i, j] + z * se[i, j])}
+    return results, intervals
@@ -5,22 +5,24 @@ from scipy.optimize import curve_fit
 from scipy.stats import linregress
 from matplotlib.colors import LinearSegmentedColormap, ListedColormap
 
-from imports.importcompsci import school_metadata as meta_cs, faculty_graph as g_cs, faculty_graph_weighted as gw_cs
-from imports.importhistory import school_metadata as meta_his, faculty_graph as g_his, faculty_graph_weighted as gw_his
-from imports.importbusiness import school_metadata as meta_busi, faculty_graph as g_busi, faculty_graph_weighted as gw_busi
+from imports.departments import department_of_path, get_department
+from epidemic.blocks import position_block_matrix
+from epidemic.csr import CSRGraph
+from epidemic.distances import mean_reachable_distance
+from epidemic.aggregate import summary_table
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 import csv
 import math
+import os
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import matplotlib.ticker as ticker
 import matplotlib
 import networkx as nx
 import numpy as np
-import pickle
 import statsmodels.api as sm
 import plot_utils
 
@@ -37,42 +39,53 @@ dirs = [DIR_CS_SI, DIR_HIS_SI, DIR_BUSI_SI]
 all_departments_SI = [("Business", DIR_BUSI_SI), ("Computer Science", DIR_CS_SI), ("History", DIR_HIS_SI)]
 all_departments_SI_random_jump = [("Business", DIR_BUSI_SI_JUMP_PROBABILITY), ("Computer Science", DIR_CS_SI_JUMP_PROBABILITY), ("History", DIR_HIS_SI_JUMP_PROBABILITY)]
 
+def output_path(default, output_dir=None):
+    """`default`, or a file of the same name in `output_dir` if one is
+    given, so the figures can be drawn without overwriting results/.
+
+    """
+    if output_dir is None:
+        return default
+    return os.path.join(output_dir, os.path.basename(default))
+
 def curve(x, h, a, k):
     return h / (1 + np.exp(a * (x - k)))
 
-def avg_geodesic_path_length_from(from_node, graph):
-    assert(from_node in graph.nodes())
-    geodesic_path_lengths = [nx.shortest_path_length(graph, source=from_node, target=target)
-                             for target in graph.nodes()
-                             if target is not from_node
-                             and nx.has_path(graph, from_node, target)]
-    if len(geodesic_path_lengths) == 0.0: return 0.0
-    return np.nanmean(geodesic_path_lengths)
+def avg_geodesic_path_lengths(graph, include_self=False):
+    """Average hop distance from every node to the nodes it can reach, by
+    node, from the graph's cached distance matrix.
+
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph(graph)
+    return dict(zip(graph.nodes, mean_reachable_distance(graph, include_self)))
 
 def graph_of_dir(directory):
-    if "CS" in directory:
-        if "weighted" in directory:
-            return gw_cs
-        return g_cs
-    if "HIS" in directory:
-        if "weighted" in directory:
-            return gw_his
-        return g_his
-    if "BUSI" in directory:
-        if "weighted" in directory:
-            return gw_busi
-        return g_busi
+    department = department_of_path(directory)
+    if "weighted" in directory:
+        return department.graph_weighted
+    return department.graph
 
 def meta_of_dir(directory):
-    if "CS" in directory:
-        return meta_cs
-    if "HIS" in directory:
-        return meta_his
-    if "BUSI" in directory:
-        return meta_busi
-
-def normalize(graph, node, length):
-    avg_geodesic_path_length = avg_geodesic_path_length_from(node, graph)
+    return department_of_path(directory).metadata
+
+def summary_of_dir(cache_dir):
+    """The cache's summary table, without the "other" node."""
+    table = summary_table(cache_dir, department=department_of_path(cache_dir).name)
+    return table[table.node != bad_node_of_dir(cache_dir)]
+
+def averages_by_p(table, meta, kind="size"):
+    """{p: [(pi, average), ...]}, sorted by prestige, of every node with
+    trials."""
+    results = defaultdict(list)
+    table = table[np.isfinite(table[kind + "_mean"])]
+    for p, node, avg in zip(table.p, table.node, table[kind + "_mean"]):
+        results[p].append((meta[node]["pi"], avg))
+    for p in results:
+        results[p] = sorted(results[p], key=lambda x: x[0])
+    return results
+
+def normalize(avg_geodesic_path_length, length):
     if avg_geodesic_path_length == 0 : return np.nan
     return float(length) / avg_geodesic_path_length
 
@@ -85,30 +98,24 @@ def average_across_infection_probability(tuples):
 
 # Remove the "other" nodes in these graphs
 def bad_node_of_dir(cache_dir):
-    if "CS" in cache_dir:
-        return 206
-    if "HIS" in cache_dir:
-        return 145
-    if "BUSI" in cache_dir:
-        return 113
-
-def plot_centrality():
+    return department_of_path(cache_dir).other_node
+
+def plot_centrality(output_dir=None):
     colors = iter(cm.rainbow(np.linspace(0, 1, 3)))
     markers = Line2D.filled_markers
     fig = plt.figure(figsize=(6.0, 4.))
     ax = plt.gca()
 
-    for i, (faculty_graph, school_metadata, dept) in enumerate([(g_cs, meta_cs, "Computer Science")]):
+    cs = get_department("CS")
+    for i, (faculty_graph, school_metadata, dept) in enumerate([(cs.graph, cs.metadata, cs.title)]):
         x = []; y = []
         max_pi = 0
         max_c = 0
         ccs = sorted(nx.strongly_connected_components(faculty_graph), key=len, reverse=True)
         cc = ccs[0]
+        path_lengths = avg_geodesic_path_lengths(faculty_graph, include_self=True)
         for vertex in cc:
-            c = 0
-            path_lengths = nx.single_source_shortest_path_length(faculty_graph, source=vertex).values()
-            if len(path_lengths) > 0:
-                c = np.nanmean(path_lengths)
+            c = path_lengths[vertex]
             label = school_metadata[vertex]['institution']
             x.append(school_metadata[vertex]['pi'])
             y.append(c)
@@ -142,35 +149,19 @@ def plot_centrality():
     plt.xlim(0, max_pi)
     plt.ylim(1, max_c)
     plt.legend(loc='upper left', fontsize=plot_utils.LEGEND_SIZE, frameon=False)
-    plt.savefig("results/centrality.eps", bbox_inches='tight', format='eps', dpi=1000)
+    plt.savefig(output_path("results/centrality.eps", output_dir), bbox_inches='tight', format='eps', dpi=1000)
     plt.clf()
 
-def plot_grouped_adjacency():
+def plot_grouped_adjacency(output_dir=None):
   fig, ax = plt.subplots(1, 1, figsize=(6, 4))
 
-  for l, (g, title) in enumerate([(g_cs, "Computer Science")]):
-    # Vertices are ordered by prestige in the dataset
-    adj = nx.to_numpy_matrix(g, dtype=int)
-
-    # Scale adjacency matrix by a vertex's outdegree.
-    # Edges i -> j are from row_i -> col_j
+  cs = get_department("CS")
+  for l, (g, title) in enumerate([(cs.graph, cs.title)]):
+    # Vertices are ordered by prestige in the dataset; the first 101 are
+    # grouped by tens, as the tick labels say. Edges i -> j are from
+    # row_i -> col_j
     groups = np.linspace(0, 100, 11)
-    grouped_by_row = []
-    for i, row in enumerate(adj):
-      in_edges = [] 
-      for rank, edges in enumerate(row[0].tolist()[0]):
-        for j in range(int(edges)):
-          in_edges.append(rank)
-      grouped_row, _ = np.histogram(in_edges, groups)
-      grouped_by_row.append(grouped_row)
-
-    grouped = [np.zeros(len(groups)-1) for i in range(len(groups)-1)]
-    for i, row in enumerate(grouped_by_row):
-      for j in range(len(groups)-1):
-        if i <= groups[j+1]:
-          for k, elem in enumerate(row):
-            grouped[j][k] += elem
-          break
+    grouped = position_block_matrix(g, groups)
 
     colors = iter(cm.rainbow(np.linspace(0, 1, 3)))
     r,g,b = next(colors)[:3]  # Unpack RGB vals (0. to 1., not 0 to 255).
@@ -197,47 +188,26 @@ def plot_grouped_adjacency():
   plot_utils.finalize(ax)
 
   plt.tight_layout()
-  plt.savefig("results/grouped_adjacency.eps", format='eps', dpi=1000)
+  plt.savefig(output_path("results/grouped_adjacency.eps", output_dir), format='eps', dpi=1000)
   plt.clf()
 
 # Epidemic size versus prestige for various infection probabilities p
-def plot_si_prestige_size(cache_dirs):
+def plot_si_prestige_size(cache_dirs, output_dir=None):
     fig, ax = plt.subplots(1, 1, figsize=(6.0, 4.0), sharey=True)
 
     (title, cache_dir) = cache_dirs
-    cache = pickle.load(open(cache_dir, 'rb'))
+    table = summary_of_dir(cache_dir)
     meta = meta_of_dir(cache_dir)
     graph = graph_of_dir(cache_dir)
-    results_size = defaultdict(list)
-    for p in cache["size"].keys():
-        for node, sizes in cache["size"][p].items():
-            if node is bad_node_of_dir(cache_dir):
-                continue
-
-            avg = np.average(sizes)
-            if not np.isnan(avg) and not np.isinf(avg):
-                result = (meta[node]["pi"], avg)
-                results_size[p].append(result)
-
-        results_size[p] = sorted(results_size[p], key=lambda x: x[0])
+    results_size = averages_by_p(table, meta, "size")
 
-    filtered = sorted(cache["size"].keys())[1::2]
+    filtered = sorted(table.p.unique())[1::2]
     length_of_results = len(filtered)
 
-    with open(cache_dir.replace(".p", "_size.tsv"), 'w') as file:
-        writer = csv.writer(file, delimiter='\t')
-        writer.writerow(["infection_prob", "prestige", "size"])
-        for p, data in sorted(results_size.items(), key=lambda x: x[0]):
-            if p not in filtered:
-                continue
-            for (pi, size) in data:
-                if not np.isnan(size) and not np.isinf(size):
-                    writer.writerow([p, pi, size])
-
     colors = iter(cm.rainbow(np.linspace(0, 1, length_of_results)))
     markers = Line2D.filled_markers; count = -1
 
-    with open(cache_dir.replace(".p", "_size.tsv"), 'w') as file:
+    with open(output_path(cache_dir.replace(".p", "_size.tsv"), output_dir), 'w') as file:
         writer = csv.writer(file, delimiter='\t')
         writer.writerow(["infection_prob", "prestige", "size"])
         for p, data in sorted(results_size.items(), key=lambda x: x[0]):
@@ -274,28 +244,22 @@ def plot_si_prestige_size(cache_dirs):
     plot_utils.finalize(ax)
     plt.ylim(0, 1)
     plt.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=plot_utils.LEGEND_SIZE, title='Transmission\nProbability, $p$', frameon=False, scatterpoints=1)
-    plt.savefig('results/size-results-of-ALL-SI.eps', bbox_inches='tight', format='eps', dpi=1000)
+    plt.savefig(output_path('results/size-results-of-ALL-SI.eps', output_dir), bbox_inches='tight', format='eps', dpi=1000)
 
-def plot_si_prestige_length(cache_dirs, ylim=(0,5)):
+def plot_si_prestige_length(cache_dirs, ylim=(0,5), output_dir=None):
     fig, ax = plt.subplots(1, 1, figsize=(6.0, 4.0), sharey=True)
 
     (title, cache_dir) = cache_dirs
-    cache = pickle.load(open(cache_dir, 'rb'))
+    table = summary_of_dir(cache_dir)
     meta = meta_of_dir(cache_dir)
     graph = graph_of_dir(cache_dir)
+    path_lengths = avg_geodesic_path_lengths(graph)
     results_length = defaultdict(list)
-    for p in cache["length"].keys():
-        for node, lengths in cache["length"][p].items():
-            if node is bad_node_of_dir(cache_dir):
-                continue
-
-            avg = np.average(lengths)
-            y = normalize(graph, node, avg)
-            if not np.isnan(avg) and not np.isinf(avg) and not np.isnan(y):
-                result = (meta[node]["pi"], y)
-                results_length[p].append(result)
-
-        results_length[p] = sorted(results_length[p], key=lambda x: x[0])
+    with_trials = table[np.isfinite(table.length_mean)]
+    for p, node, avg in zip(with_trials.p, with_trials.node, with_trials.length_mean):
+        y = normalize(path_lengths.get(node, 0), avg)
+        if not np.isnan(y):
+            results_length[p].append((meta[node]["pi"], y))
 
     for ratio, data in results_length.copy().items():
         avg_by_prestige = defaultdict(list)
@@ -305,7 +269,7 @@ def plot_si_prestige_length(cache_dirs, ylim=(0,5)):
         results_length[ratio] = [(pi, np.average(lengths)) for pi, lengths in avg_by_prestige.items()]
         results_length[ratio] = sorted(results_length[ratio], key=lambda x: x[0])
 
-    filtered = sorted(cache["length"].keys())[1::2]
+    filtered = sorted(table.p.unique())[1::2]
     length_of_results = len(filtered)
 
     colors = iter(cm.rainbow(np.linspace(0, 1, length_of_results)))
@@ -339,29 +303,18 @@ def plot_si_prestige_length(cache_dirs, ylim=(0,5)):
 
     plt.ylim(ylim)
     plt.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=plot_utils.LEGEND_SIZE, title='Transmission\nProbability, $p$', frameon=False, scatterpoints=1)
-    plt.savefig('results/length-results-of-ALL-SI.eps', bbox_inches='tight', format='eps', dpi=1000)
+    plt.savefig(output_path('results/length-results-of-ALL-SI.eps', output_dir), bbox_inches='tight', format='eps', dpi=1000)
 
-def plot_random_hop_size(cache_dirs, ylim=(0, 1)):
+def plot_random_hop_size(cache_dirs, ylim=(0, 1), output_dir=None):
     fig, ax = plt.subplots(1, 1, figsize=(6.0, 4.0), sharey=True)
 
     (title, cache_dir) = cache_dirs
-    cache = pickle.load(open(cache_dir, 'rb'))
+    table = summary_of_dir(cache_dir)
     meta = meta_of_dir(cache_dir)
     graph = graph_of_dir(cache_dir)
-    results_size = defaultdict(list)
-    for p in cache["size"].keys():
-        for node, sizes in cache["size"][p].items():
-            if node is bad_node_of_dir(cache_dir):
-                continue
-
-            avg = np.average(sizes)
-            if not np.isnan(avg) and not np.isinf(avg):
-                result = (meta[node]["pi"], avg)
-                results_size[p].append(result)
+    results_size = averages_by_p(table, meta, "size")
 
-        results_size[p] = sorted(results_size[p], key=lambda x: x[0])
-
-    filtered = sorted(cache["size"].keys())[1::2]
+    filtered = sorted(table.p.unique())[1::2]
     length_of_results = len(filtered)
 
     colors = iter(cm.rainbow(np.linspace(0, 1, length_of_results)))
@@ -391,28 +344,21 @@ def plot_random_hop_size(cache_dirs, ylim=(0, 1)):
         
     plt.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=plot_utils.LEGEND_SIZE, title="Jump\nProbability, $q$", scatterpoints=1, frameon=False)
     plt.ylim(ylim)
-    plt.savefig('results/size-results-of-ALL-SI-random-hops.eps', bbox_inches='tight', format='eps', dpi=1000)
+    plt.savefig(output_path('results/size-results-of-ALL-SI-random-hops.eps', output_dir), bbox_inches='tight', format='eps', dpi=1000)
 
 # Epidemic size versus infection probability for all institutions
-def plot_size_infection_probability(cache_dirs, threshold=0.00, bins=range(0, 100, 10)):
+def plot_size_infection_probability(cache_dirs, threshold=0.00, bins=range(0, 100, 10), output_dir=None):
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12.0, 4.0), sharey=True)
 
     (title, cache_dir) = cache_dirs
-    cache = pickle.load(open(cache_dir, 'rb'))
+    table = summary_of_dir(cache_dir)
     meta = meta_of_dir(cache_dir)
     graph = graph_of_dir(cache_dir)
     results_size = defaultdict(list)
 
-    for p in cache["size"].keys():
-        for node, sizes in cache["size"][p].items():
-            if node is bad_node_of_dir(cache_dir):
-                continue
-
-            pi = meta[node]["pi"]
-            avg = np.average(sizes)
-            if not np.isnan(avg) and not np.isinf(avg):
-                result = (p, avg)
-                results_size[pi].append(result)
+    for p, data in averages_by_p(table, meta, "size").items():
+        for (pi, avg) in data:
+            results_size[pi].append((p, avg))
 
     # Remove data below a threshold
     for pi, data in results_size.copy().items():
@@ -496,7 +442,7 @@ def plot_size_infection_probability(cache_dirs, threshold=0.00, bins=range(0, 10
     ax2.text(0.015, 0.95, r"{\bf (B)}", fontsize=26, weight='heavy', transform=ax2.transAxes)
 
     plt.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize=plot_utils.LEGEND_SIZE, scatterpoints=1, frameon=False)
-    plt.savefig('results/infectious-size-results-of-ALL-SI.eps', bbox_inches='tight', format='eps', dpi=1000)
+    plt.savefig(output_path('results/infectious-size-results-of-ALL-SI.eps', output_dir), bbox_inches='tight', format='eps', dpi=1000)
 
 if __name__ == "__main__":
     plot_centrality()
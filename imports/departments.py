@@ -0,0 +1,77 @@
+from imports.loader import build_csr, build_graph, build_weighted_graph, load_department
+
+
+class Department(object):
+    """A department's faculty hiring network.
+
+    Nothing is read from disk until one of the properties is first used,
+    and every property is computed only once.
+
+    Parameters
+    ----------
+    name : short name, also the prefix of the data and cache files (e.g. "CS")
+
+    title : full name of the department
+
+    other_node : the vertex standing for every institution outside the
+        dataset, whose edges are left out of the graphs
+
+    """
+    def __init__(self, name, title, other_node):
+        self.name = name
+        self.title = title
+        self.other_node = other_node
+        self._cache = {}
+
+    def _memoized(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def _load(self):
+        return load_department("data/{0}_vertexlist.txt".format(self.name),
+                               "data/{0}_edgelist.txt".format(self.name),
+                               other_node=self.other_node)
+
+    @property
+    def metadata(self):
+        return self._memoized("data", self._load)[0]
+
+    @property
+    def vertex_names(self):
+        return self._memoized("data", self._load)[1]
+
+    @property
+    def edges(self):
+        return self._memoized("data", self._load)[2]
+
+    @property
+    def graph(self):
+        return self._memoized("graph", lambda: build_graph(self.edges))
+
+    @property
+    def graph_weighted(self):
+        return self._memoized("graph_weighted", lambda: build_weighted_graph(self.graph))
+
+    @property
+    def csr(self):
+        return self._memoized("csr", lambda: build_csr(self.edges))
+
+
+DEPARTMENTS = dict((department.name, department) for department in [
+    Department("CS", "Computer Science", other_node=206),
+    Department("HIS", "History", other_node=145),
+    Department("BUSI", "Business", other_node=113)])
+
+
+def get_department(name):
+    return DEPARTMENTS[name]
+
+
+def department_of_path(path):
+    """The department a data or cache path like "cache/CS_SI.p" belongs to.
+
+    """
+    for name in ["CS", "HIS", "BUSI"]:
+        if name in path:
+            return DEPARTMENTS[name]
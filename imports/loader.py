@@ -0,0 +1,109 @@
+import csv
+import networkx
+import numpy as np
+import pandas as pd
+
+from epidemic.csr import CSRGraph
+
+VERTEX_COLUMNS = ["u", "pi", "USN2010", "NRC95", "region", "institution"]
+EDGE_COLUMNS = ["u", "v", "rank", "gender"]
+
+
+def _read_tsv(path, names, dtype, chunksize):
+    # Every file starts with a "# ..." header line
+    return pd.read_csv(path, sep='\t', skiprows=1, header=None, names=names, dtype=dtype,
+                       quoting=csv.QUOTE_NONE, keep_default_na=False, chunksize=chunksize)
+
+
+def read_vertices(path):
+    """Read a vertex list into arrays: u, pi, USN2010, NRC95, region and
+    institution. Missing ranks (".") become NaN.
+
+    """
+    frame = _read_tsv(path, VERTEX_COLUMNS, dtype=str, chunksize=None)
+    return {"u": frame["u"].astype(np.int64).values,
+            "pi": frame["pi"].astype(np.float64).values,
+            "USN2010": pd.to_numeric(frame["USN2010"], errors='coerce').values,
+            "NRC95": pd.to_numeric(frame["NRC95"], errors='coerce').values,
+            "region": frame["region"].str.strip().values,
+            "institution": frame["institution"].str.rstrip().values}
+
+
+def read_edges(path, other_node=None, chunksize=1 << 20):
+    """Read an edge list into arrays: u, v, rank and gender.
+
+    The file is streamed `chunksize` rows at a time. Edges to or from
+    `other_node`, the vertex standing for every institution outside the
+    dataset, are dropped.
+
+    """
+    dtype = {"u": np.int64, "v": np.int64, "rank": str, "gender": str}
+    columns = dict((name, []) for name in EDGE_COLUMNS)
+    for chunk in _read_tsv(path, EDGE_COLUMNS, dtype, chunksize):
+        if other_node is not None:
+            chunk = chunk[(chunk["u"] != other_node) & (chunk["v"] != other_node)]
+        for name in EDGE_COLUMNS:
+            columns[name].append(chunk[name].values)
+    return dict((name, np.concatenate(arrays)) for name, arrays in columns.items())
+
+
+def school_metadata_of(vertices):
+    """Map node number to its attributes, as the imports/*.py modules do.
+
+    """
+    school_metadata = {}
+    rows = zip(vertices["u"].tolist(), vertices["pi"].tolist(), vertices["USN2010"].tolist(),
+               vertices["NRC95"].tolist(), vertices["region"], vertices["institution"])
+    for (u, pi, USN2010, NRC95, region, institution) in rows:
+        school_metadata[u] = {"pi": pi, "USN2010": USN2010, "NRC95": NRC95,
+                              "region": region, "institution": institution}
+    return school_metadata
+
+
+def vertex_names_of(vertices):
+    return dict(zip(vertices["institution"], vertices["u"].tolist()))
+
+
+def build_graph(edges):
+    """Multi-edge, directed networkx graph of the hires in `edges`.
+
+    """
+    graph = networkx.MultiDiGraph()
+    graph.add_edges_from(zip(edges["u"].tolist(), edges["v"].tolist()))
+    return graph
+
+
+def build_weighted_graph(graph):
+    """Multi-edge, directed, weighted graph: every edge of `graph` with
+    weight 1.0, plus an edge of weight 0.0 between every ordered pair of
+    nodes.
+
+    """
+    weighted = networkx.MultiDiGraph()
+    for (u, v) in graph.edges():
+        weighted.add_edge(u, v, weight = 1.0)
+
+    for u in graph.nodes():
+        for v in graph.nodes():
+            weighted.add_edge(u, v, weight = 0.0)
+    return weighted
+
+
+def build_csr(edges):
+    """`CSRGraph` of the hires in `edges`, built without networkx. Its
+    nodes are numbered as in `build_graph`.
+
+    """
+    return CSRGraph.from_edges(edges["u"], edges["v"])
+
+
+def load_department(vertex_path, edge_path, other_node):
+    """Read a department's vertex and edge lists.
+
+    Returns (school_metadata, vertex_names, edges), where edges holds the
+    arrays of `read_edges`.
+
+    """
+    vertices = read_vertices(vertex_path)
+    return (school_metadata_of(vertices), vertex_names_of(vertices),
+            read_edges(edge_path, other_node))
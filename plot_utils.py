@@ -21,11 +21,11 @@ TITLE_SIZE = 16
 LEGEND_SIZE = 12
 LINE_WIDTH = 2
 LIGHT_COLOR = '0.8'
-LIGHT_COLOR_V = np.array([float(LIGHT_COLOR) for i in xrange(3)])
+LIGHT_COLOR_V = np.array([float(LIGHT_COLOR) for i in range(3)])
 DARK_COLOR = '0.4'
-DARK_COLOR_V = np.array([float(DARK_COLOR) for i in xrange(3)])
+DARK_COLOR_V = np.array([float(DARK_COLOR) for i in range(3)])
 ALMOST_BLACK = '0.125'
-ALMOST_BLACK_V = np.array([float(ALMOST_BLACK) for i in xrange(3)])
+ALMOST_BLACK_V = np.array([float(ALMOST_BLACK) for i in range(3)])
 ACCENT_COLOR_1 = np.array([255., 145., 48.]) / 255.
 
 # Configuration
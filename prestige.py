@@ -1,6 +1,7 @@
 from collections import defaultdict, OrderedDict
 from scipy.stats import pearsonr
-from importcompsci import school_metadata as meta_cs, faculty_graph as g_cs, faculty_graph_weighted as gw_cs
+from imports.departments import department_of_path
+from epidemic.aggregate import summary_table
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -8,25 +9,39 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 import networkx as nx
 import numpy as np
 import pandas as pd
-import pickle
 import statsmodels.api as sm
 
 DIR_CS_SI = "cache/CS_SI.p"
 
 def graph_of_dir(directory):
-    if "CS" in directory:
-        if "weighted" in directory:
-            return gw_cs
-        return g_cs
+    department = department_of_path(directory)
+    if "weighted" in directory:
+        return department.graph_weighted
+    return department.graph
 
 def meta_of_dir(directory):
-    if "CS" in directory:
-        return meta_cs
+    return department_of_path(directory).metadata
 
 # Remove the node denoting "other"
 def bad_node_of_dir(cache_dir):
-    if "CS" in cache_dir:
-        return 206
+    return department_of_path(cache_dir).other_node
+
+def eigenvector_centrality(weights, max_iter=100, tol=1.0e-6):
+    """Eigenvector centrality of every node, from a sparse (N, N) matrix
+    where weights[u, v] is the weight of the edge u -> v. Iterates the same
+    way as networkx.eigenvector_centrality, without building a graph.
+
+    """
+    n = weights.shape[0]
+    incoming = weights.T.tocsr()
+    x = np.ones(n) / float(n)
+    for _ in range(max_iter):
+        last = x
+        x = last + incoming.dot(last)
+        x = x / (np.linalg.norm(x) or 1.0)
+        if np.abs(x - last).sum() < n * tol:
+            return x
+    raise nx.PowerIterationFailedConvergence(max_iter)
 
 # How do other network measures correlate with epidemic size?
 def pearson_correlation(cache_dirs, value=0.1):
@@ -34,26 +49,19 @@ def pearson_correlation(cache_dirs, value=0.1):
     print("title: {0}".format(title))
     
     # Load up all the data
-    cache = pickle.load(open(cache_dir, 'rb'))
+    table = summary_table(cache_dir, department=department_of_path(cache_dir).name)
+    table = table[(table.node != bad_node_of_dir(cache_dir)) & np.isfinite(table.size_mean)]
     meta = meta_of_dir(cache_dir)
     graph = graph_of_dir(cache_dir)
-    weighted_graph = nx.DiGraph()
-    for u, v, data in graph.edges(data=True):
-        if weighted_graph.has_edge(v, u): weighted_graph[v][u]['weight'] += 1.0
-        else: weighted_graph.add_edge(v, u, weight = 1.0)
+    # Hires counted along reversed edges, so prestige flows to the hiring school
+    hires = department_of_path(cache_dir).csr
+    reversed_weights = hires.weight_matrix().T
     
     # Average across all infection probabilities and prestige values
     results_size = defaultdict(list)
-    for p in cache["size"].keys():
-        for node, sizes in cache["size"][p].items():
-            if node is bad_node_of_dir(cache_dir):
-                continue
-
-            avg = np.average(sizes)
-            if not np.isnan(avg) and not np.isinf(avg):
-                result = (meta[node]["pi"], avg)
-                results_size[p].append(result)
-
+    for p, node, avg in zip(table.p, table.node, table.size_mean):
+        results_size[p].append((meta[node]["pi"], avg))
+    for p in results_size:
         results_size[p] = sorted(results_size[p], key=lambda x: x[0])
 
     # Other (non-prestige) parameters
@@ -61,15 +69,15 @@ def pearson_correlation(cache_dirs, value=0.1):
     outd = OrderedDict(sorted(nx.out_degree_centrality(graph).items()))
     d = OrderedDict(sorted(nx.degree_centrality(graph).items()))
     close = OrderedDict(sorted(nx.closeness_centrality(graph).items()))
-    eigen = OrderedDict(sorted(nx.eigenvector_centrality(weighted_graph, weight='weight').items()))
+    eigen = OrderedDict(sorted(zip(hires.nodes, eigenvector_centrality(reversed_weights))))
     parameters = {
-        "in_degree": [v for i, v in ind.iteritems()], 
-        "out_degree": [v for i, v in outd.iteritems()],
-        "degree": [v for i, v in d.iteritems()],
-        "closeness": [v for i, v in close.iteritems()],
-        "eigenvector": [v for i, v in eigen.iteritems()]}
+        "in_degree": [v for i, v in ind.items()], 
+        "out_degree": [v for i, v in outd.items()],
+        "degree": [v for i, v in d.items()],
+        "closeness": [v for i, v in close.items()],
+        "eigenvector": [v for i, v in eigen.items()]}
 
-    filtered = sorted(cache["size"].keys())
+    filtered = sorted(results_size)
     length_of_results = len(filtered)
     
     # Generate table of correlations
@@ -91,4 +99,4 @@ def pearson_correlation(cache_dirs, value=0.1):
 
 
 if __name__ == "__main__":
-    print pearson_correlation(("Computer Science", DIR_CS_SI))
+    print(pearson_correlation(("Computer Science", DIR_CS_SI)))
@@ -0,0 +1,29 @@
+import os
+import sys
+import networkx as nx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+@pytest.fixture
+def hiring_graph():
+    """A small hiring-like MultiDiGraph: a random directed graph with a
+    few parallel edges, several strongly connected components and nodes
+    that reach nothing.
+
+    """
+    graph = nx.MultiDiGraph(nx.gnp_random_graph(40, 0.06, directed=True, seed=7))
+    graph.add_edges_from([(0, 1), (0, 1), (2, 3), (5, 5)])
+    graph.add_nodes_from([40, 41])
+    return graph
+
+
+@pytest.fixture(autouse=True)
+def scratch_directory(tmp_path, monkeypatch):
+    """Run every test from its own temporary directory, so relative paths
+    such as cache/graphs, where reachability indices and hop distances
+    are saved, never reach the repository's.
+
+    """
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from epidemic.accumulate import Accumulator, SummaryStore
+from epidemic.store import ResultsStore, arrays_of_results
+from epidemic.sweep import empty_results, merge_results
+
+PS = [0.2, 0.6]
+NODES = [3, 1]
+
+
+def batch(n_trials, rng):
+    results = empty_results(PS)
+    for p in PS:
+        for node in NODES:
+            # Sizes are fractions of the nodes, as in an epidemic on 40 nodes
+            results["size"][p][node].extend((rng.integers(1, 41, n_trials) / 40.0).tolist())
+            results["length"][p][node].extend(rng.integers(1, 12, n_trials).tolist())
+    return results
+
+
+def check(accumulator, results):
+    arrays = arrays_of_results(results)
+    for i, p in enumerate(accumulator.ps):
+        for j, node in enumerate(accumulator.nodes):
+            for kind in ("size", "length"):
+                values = arrays[kind][(arrays["p"] == p) & (arrays["node"] == node)].astype(np.float64)
+                assert accumulator.counts[i, j] == len(values)
+                assert np.isclose(accumulator.mean(kind)[i, j], np.mean(values))
+                assert np.isclose(accumulator.std(kind)[i, j] ** 2, np.var(values, ddof=1))
+                assert accumulator.minima[kind][i, j] == values.min()
+                assert accumulator.maxima[kind][i, j] == values.max()
+                quantiles = accumulator.quantiles(kind, [0.1, 0.5, 0.9])[:, i, j]
+                assert np.allclose(quantiles, np.percentile(values, [10, 50, 90]))
+
+
+def test_accumulator_matches_numpy():
+    rng = np.random.default_rng(0)
+    results = batch(25, rng)
+    accumulator = Accumulator()
+    accumulator.add(results)
+    assert accumulator.ps == sorted(PS) and accumulator.nodes == sorted(NODES)
+    check(accumulator, results)
+
+
+def test_merged_accumulators_match_one():
+    rng = np.random.default_rng(1)
+    batches = [batch(n, rng) for n in (1, 7, 30)]
+    merged = Accumulator()
+    everything = empty_results(PS)
+    for results in batches:
+        merged.merge(Accumulator.from_arrays(arrays_of_results(results)))
+        merge_results(everything, results)
+    check(merged, everything)
+
+
+def test_accumulator_grows_its_grid():
+    rng = np.random.default_rng(2)
+    accumulator = Accumulator.from_arrays(arrays_of_results(batch(5, rng)))
+    extra = empty_results([0.9])
+    extra["size"][0.9][7] = [0.5, 0.25]
+    extra["length"][0.9][7] = [2, 3]
+    accumulator.add(extra)
+    assert accumulator.ps == [0.2, 0.6, 0.9] and accumulator.nodes == [1, 3, 7]
+    assert accumulator.counts.tolist() == [[5, 5, 0], [5, 5, 0], [0, 0, 2]]
+    assert np.isnan(accumulator.mean("size")[0, 2])
+    assert accumulator.mean("size")[2, 2] == 0.375
+
+
+def test_summary_store(tmp_path):
+    rng = np.random.default_rng(3)
+    store = SummaryStore(str(tmp_path / "CS_SI"))
+    everything = empty_results(PS)
+    for n in (4, 6):
+        results = batch(n, rng)
+        store.append(results, seed=n, graph_hash="abc")
+        merge_results(everything, results)
+
+    check(store.load(), everything)
+    assert store.n_trials(PS, NODES) == 10
+    assert ResultsStore(store.path).header()["kind"] == "summary"
+    with pytest.raises(ValueError):
+        store.read()
+    with pytest.raises(ValueError):
+        ResultsStore(store.path).append(batch(1, rng))
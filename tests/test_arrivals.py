@@ -0,0 +1,34 @@
+import numpy as np
+
+from epidemic.arrivals import ArrivalTimes
+
+
+def test_add_matches_a_loop(tmp_path):
+    rng = np.random.default_rng(0)
+    ps, sources, nodes = [0.2, 0.5], [4, 9, 1], list(range(6))
+    arrivals = ArrivalTimes.create(str(tmp_path / "arrivals"), ps, sources, nodes, max_time=5)
+    trials = np.zeros((2, 3), dtype=np.int64)
+    counts = np.zeros((2, 3, 6), dtype=np.int64)
+    time_sums = np.zeros((2, 3, 6))
+    histogram = np.zeros((2, 3, 6, 5), dtype=np.int64)
+    for n_epidemics in (7, 1, 30):
+        p_index = rng.integers(0, 2, n_epidemics)
+        source_index = rng.integers(0, 3, n_epidemics)
+        # Some arrivals are later than max_time, and land in the last bin
+        arrival = rng.integers(-1, 8, (n_epidemics, 6))
+        arrivals.add(p_index, source_index, arrival)
+        for i, s, times in zip(p_index, source_index, arrival):
+            trials[i, s] += 1
+            for v, t in enumerate(times):
+                if t >= 0:
+                    counts[i, s, v] += 1
+                    time_sums[i, s, v] += t
+                    histogram[i, s, v, min(t, 4)] += 1
+    arrivals.flush()
+
+    reopened = ArrivalTimes.open(arrivals.path)
+    for loaded in (arrivals, reopened):
+        assert (loaded.trials == trials).all()
+        assert (loaded.counts == counts).all()
+        assert np.allclose(loaded.time_sums, time_sums)
+        assert (loaded.histogram == histogram).all()
@@ -0,0 +1,32 @@
+import networkx as nx
+import numpy as np
+
+from epidemic.blocks import position_block_matrix
+
+
+def grouped_by_loop(graph, groups):
+    """The grouped adjacency matrix as getplots.py used to build it."""
+    adj = nx.to_numpy_array(graph, dtype=int)
+    grouped_by_row = []
+    for i, row in enumerate(adj):
+        in_edges = []
+        for rank, edges in enumerate(row.tolist()):
+            for j in range(int(edges)):
+                in_edges.append(rank)
+        grouped_row, _ = np.histogram(in_edges, groups)
+        grouped_by_row.append(grouped_row)
+
+    grouped = [np.zeros(len(groups)-1) for i in range(len(groups)-1)]
+    for i, row in enumerate(grouped_by_row):
+        for j in range(len(groups)-1):
+            if i <= groups[j+1]:
+                for k, elem in enumerate(row):
+                    grouped[j][k] += elem
+                break
+    return np.array(grouped)
+
+
+def test_position_blocks_match_the_loop(hiring_graph):
+    for groups in (np.linspace(0, 100, 11), np.linspace(0, 30, 4), np.linspace(0, 40, 5)):
+        assert np.array_equal(position_block_matrix(hiring_graph, groups),
+                              grouped_by_loop(hiring_graph, groups))
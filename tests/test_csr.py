@@ -0,0 +1,55 @@
+import numpy as np
+
+from epidemic.csr import CSRGraph, CSRSI
+from epidemic.epidemic import SI
+from epidemic.rng import stream
+
+
+def run(epi, node, p, n_trials, seed):
+    sizes = []; lengths = []
+    for trial in range(n_trials):
+        epi.reset(p=p, rng=stream(seed, p, node, trial))
+        epi.infect_node(node)
+        epi.simulate()
+        sizes.append(epi.size)
+        lengths.append(epi.length)
+    return np.array(sizes), np.array(lengths)
+
+
+def test_compiled_graph_keeps_every_edge(hiring_graph):
+    graph = CSRGraph(hiring_graph)
+    assert graph.number_of_nodes() == hiring_graph.number_of_nodes()
+    assert graph.number_of_edges() == hiring_graph.number_of_edges()
+    for u in hiring_graph.nodes():
+        i = graph.index[u]
+        targets = [graph.nodes[v] for v in graph.indices[graph.indptr[i]:graph.indptr[i + 1]]]
+        assert sorted(targets) == sorted(v for (_, v) in hiring_graph.out_edges(u))
+
+
+def test_certain_epidemic_matches_si(hiring_graph):
+    epi = CSRSI(hiring_graph)
+    si = SI(hiring_graph)
+    for node in hiring_graph.nodes():
+        for model in (epi, si):
+            model.reset(p=1.0, rng=stream(0))
+            model.infect_node(node)
+            model.simulate()
+        assert epi.size == si.size
+        assert epi.length == si.length
+        assert sorted(epi.timeline) == sorted(si.timeline)
+
+
+def test_csrsi_follows_si_distribution(hiring_graph):
+    # Node 0 has parallel edges and reaches most of the graph
+    n_trials = 2000
+    csr_sizes, csr_lengths = run(CSRSI(hiring_graph), 0, 0.4, n_trials, seed=1)
+    si_sizes, si_lengths = run(SI(hiring_graph), 0, 0.4, n_trials, seed=2)
+    for a, b in ((csr_sizes, si_sizes), (csr_lengths, si_lengths)):
+        se = np.sqrt(a.var(ddof=1) / n_trials + b.var(ddof=1) / n_trials)
+        assert abs(a.mean() - b.mean()) < 4 * se
+
+
+def test_csrsi_is_reproducible(hiring_graph):
+    a = run(CSRSI(hiring_graph), 0, 0.4, 50, seed=3)
+    b = run(CSRSI(hiring_graph), 0, 0.4, 50, seed=3)
+    assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
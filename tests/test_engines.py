@@ -0,0 +1,128 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from epidemic.arrivals import ArrivalTimes
+from epidemic.batch import simulate_batch
+from epidemic.coupled import simulate_coupled
+from epidemic.epidemic import SI
+from epidemic.events import EventSI
+from epidemic.percolation import simulate_percolation
+from epidemic.rng import stream
+
+N_TRIALS = 2000
+# Node 7 reaches no other node, so its epidemics only spread by jumping
+SOURCES = [0, 7]
+PS = [0.1, 0.3]
+
+
+def run(epi, source, n_trials, seed, **kwargs):
+    """Sizes and lengths of n_trials epidemics of `epi` from `source`."""
+    sizes = np.zeros(n_trials)
+    lengths = np.zeros(n_trials)
+    for trial in range(n_trials):
+        epi.reset(rng=stream(seed, trial), **kwargs)
+        epi.infect_node(source)
+        epi.simulate()
+        sizes[trial], lengths[trial] = epi.size, epi.length
+    return sizes, lengths
+
+
+def assert_same_distribution(a, b):
+    """The means and variances of two samples agree within the noise,
+    judged from both samples pooled, as if they came from one distribution.
+
+    """
+    scale = 1.0 / len(a) + 1.0 / len(b)
+    centred = np.concatenate([a, b]) - np.concatenate([a, b]).mean()
+    variance, fourth = (centred ** 2).mean(), (centred ** 4).mean()
+    assert abs(a.mean() - b.mean()) <= 4 * np.sqrt(variance * scale) + 1e-12
+    assert abs(a.var() - b.var()) <= 4 * np.sqrt((fourth - variance ** 2) * scale) + 1e-12
+
+
+def assert_follows_si(graph, outcome, seed):
+    """`outcome`, an engine's results on the (PS, SOURCES) grid, follows
+    the distribution of `SI`'s.
+
+    """
+    for i, p in enumerate(PS):
+        si = SI(graph, p=p)
+        for j, source in enumerate(SOURCES):
+            expected = run(si, source, N_TRIALS, seed=seed)
+            for kind, b in zip(("size", "length"), expected):
+                assert_same_distribution(outcome[kind][i, j].astype(np.float64), b)
+
+
+def test_batch_follows_si(hiring_graph):
+    outcome = simulate_batch(hiring_graph, SOURCES, PS, N_TRIALS, max_replicas=1000, rng=stream(5))
+    assert_follows_si(hiring_graph, outcome, seed=6)
+
+
+def test_percolation_follows_si(hiring_graph):
+    # The sources of a trial share their percolated graph, which leaves
+    # each source's own distribution as it is
+    outcome = simulate_percolation(hiring_graph, SOURCES, PS, N_TRIALS, rng=stream(7))
+    assert_follows_si(hiring_graph, outcome, seed=8)
+
+
+def test_coupled_follows_si(hiring_graph):
+    outcome = simulate_coupled(hiring_graph, SOURCES, PS, N_TRIALS, rng=stream(9))
+    assert_follows_si(hiring_graph, outcome, seed=10)
+    # Each p alone follows SI, while the epidemics of a trial only grow with p
+    assert (np.diff(outcome["size"], axis=0) >= 0).all()
+
+
+def test_arrival_times_follow_si(hiring_graph, tmp_path):
+    nodes = list(hiring_graph.nodes())
+    arrivals = ArrivalTimes.create(str(tmp_path / "arrivals"), PS, SOURCES, nodes)
+    simulate_batch(hiring_graph, SOURCES, PS, N_TRIALS, rng=stream(11), arrivals=arrivals)
+    for i, p in enumerate(PS):
+        epi = SI(hiring_graph, p=p)
+        for s, source in enumerate(SOURCES):
+            # Arrival times as generations: one more than the time in the
+            # timeline, except for the source
+            times = dict((node, []) for node in nodes)
+            for trial in range(N_TRIALS):
+                epi.reset(rng=stream(12, trial))
+                epi.infect_node(source)
+                epi.simulate()
+                for node, time in epi.timeline:
+                    times[node].append(0 if node == source else time + 1)
+
+            for v, node in enumerate(nodes):
+                expected = np.array(times[node], dtype=np.float64)
+                reached = np.repeat(np.arange(arrivals.max_time), arrivals.histogram[i, s, v])
+                assert arrivals.trials[i, s] == N_TRIALS
+                assert arrivals.counts[i, s, v] == len(reached)
+                # Whether the node is reached, then when
+                assert_same_distribution(np.arange(N_TRIALS) < len(reached),
+                                         np.arange(N_TRIALS) < len(expected))
+                if min(len(reached), len(expected)) >= 30:
+                    assert_same_distribution(reached.astype(np.float64), expected)
+
+
+@pytest.mark.parametrize("random_jump_p", [0.0, 0.5, 1.0])
+def test_events_follow_si(hiring_graph, random_jump_p):
+    si = SI(hiring_graph, p=0.2, is_random_jump=True, random_jump_p=random_jump_p)
+    events = EventSI(hiring_graph, p=0.2, is_random_jump=True, random_jump_p=random_jump_p)
+    for source in SOURCES:
+        expected = run(si, source, N_TRIALS, seed=1)
+        actual = run(events, source, N_TRIALS, seed=2)
+        for a, b in zip(actual, expected):
+            assert_same_distribution(a, b)
+
+
+def test_events_jump_after_same_step_infections():
+    # 0 infects 2, then 1; in the next step, 1 infects 3..8 while 2, which
+    # reaches nothing, jumps. Its jump must not land on 3..8 before they
+    # are infected (`SI` visits 1 first, by its label), or it is wasted
+    graph = nx.MultiDiGraph()
+    graph.add_nodes_from([0, 2, 1])
+    graph.add_edges_from([(0, 2), (0, 1)] + [(1, v) for v in range(3, 9)])
+    graph.add_nodes_from(range(9, 15))
+    si = SI(graph, p=1.0, is_random_jump=True, random_jump_p=0.5)
+    events = EventSI(graph, p=1.0, is_random_jump=True, random_jump_p=0.5)
+    expected = run(si, 0, N_TRIALS, seed=3)
+    actual = run(events, 0, N_TRIALS, seed=4)
+    for a, b in zip(actual, expected):
+        assert_same_distribution(a, b)
@@ -0,0 +1,48 @@
+import networkx as nx
+import numpy as np
+
+from epidemic.csr import CSRGraph, CSRSI
+from epidemic.exact import exact_outcome, exact_results
+
+
+def test_no_transmission_at_p0(hiring_graph):
+    nodes = list(hiring_graph.nodes())
+    outcome = exact_outcome(hiring_graph, nodes, p=0.0)
+    assert np.allclose(outcome["size"], 1.0 / len(nodes))
+    assert (outcome["length"] == 1).all()
+
+
+def test_everything_reachable_at_p1(hiring_graph):
+    nodes = list(hiring_graph.nodes())
+    outcome = exact_outcome(hiring_graph, nodes, p=1.0)
+    epi = CSRSI(hiring_graph)
+    for j, node in enumerate(nodes):
+        reached = len(nx.descendants(hiring_graph, node)) + 1
+        farthest = max(nx.single_source_shortest_path_length(hiring_graph, node).values())
+        assert outcome["size"][j] == reached / float(len(nodes))
+        assert outcome["length"][j] == farthest + 1
+
+        epi.reset(p=1.0)
+        epi.infect_node(node)
+        epi.simulate()
+        assert (epi.size, epi.length) == (outcome["size"][j], outcome["length"][j])
+
+
+def test_random_outcomes_are_not_exact(hiring_graph):
+    assert exact_outcome(hiring_graph, [0], p=0.5) is None
+    assert exact_outcome(hiring_graph, [0], p=0.0, is_random_jump=True, random_jump_p=0.1) is None
+    # p * weight is below 1 on an edge of weight 0.5
+    weighted = CSRGraph.from_edges([0, 1], [1, 2], weights=[1.0, 0.5])
+    assert exact_outcome(weighted, [0], p=1.0) is None
+
+
+def test_missing_source_gives_empty_epidemic(hiring_graph):
+    outcome = exact_outcome(hiring_graph, ["nowhere"], p=1.0)
+    assert outcome["size"][0] == 0.0
+    assert outcome["length"][0] == 1
+
+
+def test_exact_results_only_hold_deterministic_values(hiring_graph):
+    results = exact_results(hiring_graph, [0, 1], [0.0, 0.5, 1.0], 3)
+    assert sorted(results["size"]) == [0.0, 1.0]
+    assert all(len(trials) == 3 for trials in results["length"][1.0].values())
@@ -0,0 +1,51 @@
+import os
+import networkx as nx
+import numpy as np
+
+from epidemic import reachability
+from epidemic.csr import CSRGraph
+from epidemic.reachability import ReachabilityIndex
+
+
+def reachable_sets(index, graph):
+    return dict((node, set(np.array(graph.nodes)[index.reachable_mask(i)].tolist()))
+                for node, i in graph.index.items())
+
+
+def test_index_matches_descendants(hiring_graph):
+    graph = CSRGraph(hiring_graph)
+    index = ReachabilityIndex.build(graph)
+    assert index.n_components == nx.number_strongly_connected_components(hiring_graph)
+    for node, reached in reachable_sets(index, graph).items():
+        assert reached == nx.descendants(hiring_graph, node) | {node}
+        i = graph.index[node]
+        assert (index.unreachable_mask(i) == ~index.reachable_mask(i)).all()
+
+
+def test_index_is_cached_by_graph_hash(hiring_graph, tmp_path, monkeypatch):
+    monkeypatch.setattr(reachability, "_loaded", {})
+    graph = CSRGraph(hiring_graph)
+    built = ReachabilityIndex.of(graph, cache_dir=str(tmp_path))
+    assert os.listdir(str(tmp_path)) == ["reachability-{0}.npz".format(graph.content_hash())]
+
+    # Read back from disk by a fresh process
+    monkeypatch.setattr(reachability, "_loaded", {})
+    loaded = ReachabilityIndex.of(graph, cache_dir=str(tmp_path))
+    assert loaded is not built
+    assert reachable_sets(loaded, graph) == reachable_sets(built, graph)
+
+
+def test_unreadable_cache_is_rebuilt(hiring_graph, tmp_path, monkeypatch):
+    monkeypatch.setattr(reachability, "_loaded", {})
+    graph = CSRGraph(hiring_graph)
+    path = tmp_path / "reachability-{0}.npz".format(graph.content_hash())
+    # As left by a writer that crashed halfway
+    path.write_bytes(b"PK\x03\x04")
+    index = ReachabilityIndex.of(graph, cache_dir=str(tmp_path))
+    assert reachable_sets(index, graph) == reachable_sets(ReachabilityIndex.build(graph), graph)
+
+    # The rebuilt index replaced the broken file, leaving nothing else behind
+    monkeypatch.setattr(reachability, "_loaded", {})
+    assert os.listdir(str(tmp_path)) == [path.name]
+    assert reachable_sets(ReachabilityIndex.of(graph, cache_dir=str(tmp_path)), graph) == \
+        reachable_sets(index, graph)
@@ -0,0 +1,115 @@
+import os
+import numpy as np
+import pytest
+
+from epidemic.store import ResultsStore, load_results
+from epidemic.sweep import empty_results
+
+
+def batch(ps, nodes, n_trials, rng):
+    results = empty_results(ps)
+    for p in ps:
+        for node in nodes:
+            results["size"][p][node].extend(rng.random(n_trials).astype(np.float32).tolist())
+            results["length"][p][node].extend(rng.integers(1, 9, n_trials).tolist())
+    return results
+
+
+def test_append_and_resume(tmp_path):
+    store = ResultsStore(str(tmp_path / "CS_SI"))
+    rng = np.random.default_rng(0)
+    assert store.n_trials([0.5], [1, 2]) == 0
+
+    store.append(batch([0.5, 1.0], [1, 2], 3, rng), seed=1, graph_hash="abc")
+    assert store.n_trials([0.5, 1.0], [1, 2]) == 3
+    # A cell that was never run holds the count down
+    assert store.n_trials([0.5, 1.0], [1, 2, 3]) == 0
+
+    store.append(batch([0.5, 1.0], [1, 2], 2, rng), seed=2, graph_hash="abc")
+    header = store.header()
+    assert (header["counts"] == 5).all()
+    assert [entry["seed"] for entry in header["history"]] == [1, 2]
+    assert len(store.shards) == 2
+
+    with pytest.raises(ValueError):
+        store.append(batch([0.5], [1], 1, rng), graph_hash="def")
+
+
+def test_compact_round_trip(tmp_path):
+    path = str(tmp_path / "CS_SI")
+    store = ResultsStore(path)
+    rng = np.random.default_rng(1)
+    batches = [batch([0.0, 0.5], [1, 2, 3], n, rng) for n in (2, 4)]
+    for results in batches:
+        store.append(results)
+    before = store.read()
+
+    store.compact()
+    assert store.shards == []
+    after = store.read()
+    order = np.lexsort((np.arange(len(before["p"])), before["node"], before["p"]))
+    for field in ("p", "node", "size", "length"):
+        assert np.array_equal(before[field][order], after[field])
+
+    # The base is memory-mapped, and its trials keep their order
+    results = store.results()
+    assert isinstance(results.size, np.memmap)
+    assert (results.counts == 6).all()
+    expected = batches[0]["size"][0.5][2] + batches[1]["size"][0.5][2]
+    assert np.allclose(results.size[1, 1], expected)
+
+    # Appending after a compaction, then compacting again, keeps everything
+    store.append(batch([0.5], [1], 3, rng))
+    store.compact()
+    assert store.results().counts.tolist() == [[6, 6, 6], [9, 6, 6]]
+    assert len([name for name in os.listdir(path) if name.startswith("base-")]) == 1
+
+    # load_results reads the store in place of the pickle of the same name
+    loaded = load_results(path + ".p")
+    assert loaded.counts.tolist() == [[6, 6, 6], [9, 6, 6]]
+    assert np.allclose(loaded.mean("size"), store.results().mean("size"))
+
+
+def test_interrupted_compaction(tmp_path, monkeypatch):
+    path = str(tmp_path / "CS_SI")
+    store = ResultsStore(path)
+    rng = np.random.default_rng(2)
+    for n in (2, 3):
+        store.append(batch([0.5], [1, 2], n, rng))
+    before = store.read()
+    # A compaction that crashed while writing its base
+    os.makedirs(os.path.join(path, "base-000002.tmp"))
+
+    # And one that crashed once its base was in place, but not yet listed
+    def crash(manifest):
+        raise OSError("crashed")
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "_write_manifest", crash)
+        with pytest.raises(OSError):
+            store.compact()
+    assert "base-000002" in os.listdir(path)
+    assert len(store.shards) == 2
+    for field in before:
+        assert np.array_equal(store.read()[field], before[field])
+
+    store.compact()
+    assert sorted(os.listdir(path)) == ["base-000002", "manifest.json"]
+    assert store.shards == []
+    assert store.results().counts.tolist() == [[5, 5]]
+
+
+def test_load_python2_pickle(tmp_path):
+    # pickle.dump({"size": {0.5: {1: [numpy.float64(0.25)]}},
+    #              "length": {0.5: {1: [3]}}}, f, 2), as written by Python 2
+    scalar = (b"cnumpy.core.multiarray\nscalar\nq\x05cnumpy\ndtype\nq\x06U\x02f8q\x07K\x00K\x01\x87q\x08Rq\x09"
+              b"(K\x03U\x01<q\nNNNJ\xff\xff\xff\xffJ\xff\xff\xff\xffK\x00tq\x0bb"
+              b"U\x08\x00\x00\x00\x00\x00\x00\xd0?q\x0c\x86q\rRq\x0e")
+    data = (b"\x80\x02}q\x00(U\x04sizeq\x01}q\x02G?\xe0\x00\x00\x00\x00\x00\x00}q\x03K\x01]q\x04" +
+            scalar + b"assU\x06lengthq\x0f}q\x10G?\xe0\x00\x00\x00\x00\x00\x00}q\x11K\x01]q\x12K\x03assu.")
+    path = tmp_path / "CS_SI.p"
+    path.write_bytes(data)
+
+    results = load_results(str(path))
+    assert (results.ps, results.nodes) == ([0.5], [1])
+    assert results.size.tolist() == [[[0.25]]]
+    assert results.length.tolist() == [[[3]]]
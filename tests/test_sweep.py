@@ -0,0 +1,34 @@
+import numpy as np
+
+from epidemic.sweep import run_sweep
+
+PS = [0.0, 0.3, 0.6, 1.0]
+
+
+def as_plain(results):
+    return dict((kind, dict((p, dict(by_node)) for p, by_node in by_p.items()))
+                for kind, by_p in results.items())
+
+
+def test_sweep_does_not_depend_on_processes(hiring_graph):
+    nodes = [0, 2, 5, 40]
+    one = run_sweep(hiring_graph, nodes, PS, 12, processes=1, chunk_size=5, seed=11, name="test")
+    three = run_sweep(hiring_graph, nodes, PS, 12, processes=3, chunk_size=4, seed=11, name="test")
+    assert as_plain(one) == as_plain(three)
+
+
+def test_sweep_fills_every_cell(hiring_graph):
+    nodes = [0, 2]
+    results = run_sweep(hiring_graph, nodes, PS, 7, processes=2, seed=12)
+    for kind in ("size", "length"):
+        assert sorted(results[kind]) == PS
+        for p in PS:
+            assert all(len(results[kind][p][node]) == 7 for node in nodes)
+    # Nothing is infected but the source at p=0
+    assert results["size"][0.0][0] == [1.0 / hiring_graph.number_of_nodes()] * 7
+
+
+def test_sweep_depends_on_seed(hiring_graph):
+    a = run_sweep(hiring_graph, [0], [0.4], 20, processes=1, seed=13)
+    b = run_sweep(hiring_graph, [0], [0.4], 20, processes=1, seed=14)
+    assert not np.array_equal(a["size"][0.4][0], b["size"][0.4][0])
@@ -1,59 +1,176 @@
+import json
+import os
 import pickle
 import numpy as np
 import networkx as nx
 
-from collections import defaultdict
 from itertools import product
 from epidemic.epidemic import SI
+from epidemic.csr import CSRGraph, CSRSI
+from epidemic.arrivals import ArrivalTimes
+from epidemic.batch import simulate_batch
+from epidemic.coupled import simulate_coupled
+from epidemic.events import EventSI
+from epidemic.exact import exact_results
+from epidemic.percolation import simulate_percolation
+from epidemic.rng import stream
+from epidemic.sweep import empty_results, merge_results, run_adaptive_sweep, run_sweep
 from imports.importbusiness import faculty_graph, school_metadata
 
 # Add new runs of our SI epidemic simulation to our existing cache
-def run_trials(si_trials=2):
+def run_trials(si_trials=2, engine="networkx", processes=None, seed=None, store=None, target_se=0.005, profile=None, multi_edges=None, arrivals=None):
     ps = np.linspace(0, 1, 11)
     rs = np.linspace(0, 1, 5, endpoint=False)
 
-    # If starting from an empty cache:
-    results = {"size": {}, "length": {}}
-    for p in ps:
-        results["size"][p] = defaultdict(list)
-        results["length"][p] = defaultdict(list)
-    # results = pickle.load(open("cache/BUSI_SI.p", "rb"))
-    for trial in xrange(si_trials):
-        print("Trial progress: {}".format(trial / float(si_trials)))
-        for p in ps:
-            print("Transmission probability: {0}".format(p))
-            for node in school_metadata.keys():
-                epi = SI(faculty_graph.copy(), p=p)
-                epi.infect_node(node)
-                epi.simulate()
-                results["size"][p][node].append(epi.size)
-                results["length"][p][node].append(epi.length)
-    # pickle.dump(results, open("cache/BUSI_SI.p", 'wb'))
-    results.clear()
+    compiled = CSRGraph(faculty_graph)
+    if multi_edges is not None:
+        # One coin per pair of schools instead of one per hire, with the
+        # pair's probability set by multi_edges ("independent" or
+        # "single", see CSRGraph.collapse_parallel_edges)
+        if engine == "networkx":
+            raise ValueError("The networkx engine does not collapse parallel edges.")
+        compiled = compiled.collapse_parallel_edges(multi_edges)
+    if arrivals is not None and engine != "batch":
+        raise ValueError("Only the batch engine records arrival times.")
+    if engine == "csr":
+        epi = CSRSI(compiled, profile=profile)
+    elif engine == "events":
+        epi = EventSI(compiled)
+    elif engine == "networkx":
+        epi = SI(faculty_graph, profile=profile)
+    elif engine not in ("batch", "percolation", "coupled", "parallel", "adaptive"):
+        raise ValueError("Unknown engine {0!r}.".format(engine))
+
+    # Every run draws from its own stream, keyed by the seed and by what
+    # it simulates (see epidemic.rng)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    max_trials = si_trials; first_trial = 0
+    if store is not None:
+        # Trials already in the store count towards si_trials, so an
+        # interrupted sweep picks up after its last completed shard
+        first_trial = store.n_trials(ps, school_metadata.keys())
+        si_trials = max(0, si_trials - first_trial)
+        graph_hash = compiled.content_hash()
+    if engine in ("batch", "percolation", "coupled"):
+        nodes = list(school_metadata.keys())
+        simulate = {"batch": simulate_batch, "percolation": simulate_percolation,
+                    "coupled": simulate_coupled}[engine]
+        options = {}
+        if arrivals is not None:
+            # When every school is reached from every source, accumulated
+            # in memory-mapped arrays under the arrivals directory (see
+            # epidemic.arrivals.ArrivalTimes)
+            options["arrivals"] = ArrivalTimes.open_or_create(arrivals, ps, nodes, compiled.nodes)
+        batch = simulate(compiled, nodes, ps, si_trials, rng=stream(seed, "BUSI_SI", first_trial), **options)
+        batch_results = empty_results(ps)
+        for i, p in enumerate(ps):
+            for j, node in enumerate(nodes):
+                batch_results["size"][p][node].extend(batch["size"][i, j].tolist())
+                batch_results["length"][p][node].extend(batch["length"][i, j].tolist())
+        if store is not None:
+            store.append(batch_results, seed=seed, graph_hash=graph_hash)
+    elif engine == "parallel":
+        sweep_results = run_sweep(compiled, school_metadata.keys(), ps, si_trials,
+                                  processes=processes, seed=seed, name="BUSI_SI", profile=profile)
+        if store is not None:
+            store.append(sweep_results, seed=seed, graph_hash=graph_hash)
+    elif engine == "adaptive":
+        # Run each (p, node) pair until its mean size is known to within
+        # target_se, with max_trials trials at most
+        prior = store.load() if store is not None else None
+        sweep_results, intervals = run_adaptive_sweep(compiled, school_metadata.keys(), ps, target_se,
+                                                     max_trials, processes=processes, seed=seed,
+                                                     name="BUSI_SI", prior=prior, profile=profile)
+        if store is not None:
+            store.append(sweep_results, seed=seed, graph_hash=graph_hash)
+        with open("cache/BUSI_SI_intervals.json", "w") as outfile:
+            json.dump(intervals, outfile, indent=4)
+    else:
+        # p=0 and p=1 always give the same epidemic, so they are not simulated
+        # Their outcome is stored with every simulated trial, so an
+        # interrupted run leaves all cells with the same number of trials
+        exact = exact_results(compiled, school_metadata.keys(), ps, 1)
+        simulated_ps = [p for p in ps if p not in exact["size"]]
+
+        for trial in range(si_trials):
+            print("Trial progress: {}".format(trial / float(si_trials)))
+            trial_results = merge_results(empty_results(ps), exact)
+            for p in simulated_ps:
+                print("Transmission probability: {0}".format(p))
+                for node in school_metadata.keys():
+                    epi.reset(p=p, rng=stream(seed, "BUSI_SI", p, node, first_trial + trial))
+                    epi.infect_node(node)
+                    epi.simulate()
+                    trial_results["size"][p][node].append(epi.size)
+                    trial_results["length"][p][node].append(epi.length)
+            if store is not None:
+                store.append(trial_results, seed=seed, graph_hash=graph_hash)
     print("SI done")
 
 # Add new runs of our SI epidemic with random hops to our existing cache
-def run_trials_graph_with_random_hops(si_trials=2):
+def run_trials_graph_with_random_hops(si_trials=2, engine="networkx", processes=None, seed=None, store=None, target_se=0.005, profile=None):
     pjumps = np.linspace(0, 1, 11)
 
-    # If starting from an empty cache:
-    results = {"size": {}, "length": {}}
-    for p in pjumps:
-        results["size"][p] = defaultdict(list)
-        results["length"][p] = defaultdict(list)
-    # results = pickle.load(open("cache/random_jump/BUSI_SI.p", "rb"))
-    for trial in xrange(si_trials):
-        print("Trial progress: {}".format(trial / float(si_trials)))
-        for p in pjumps:
-            print("Jump probability: {0}".format(p))
-            for node in school_metadata.keys():
-                epi = SI(faculty_graph.copy(), p=0.1, random_jump_p=p, is_random_jump=True)
-                epi.infect_node(node)
-                epi.simulate()
-                results["size"][p][node].append(epi.size)
-                results["length"][p][node].append(epi.length)
-    # pickle.dump(results, open("cache/random_jump/BUSI_SI.p", 'wb'))
-    results.clear()
+    if engine == "csr":
+        epi = CSRSI(CSRGraph(faculty_graph), p=0.1, is_random_jump=True, profile=profile)
+    elif engine == "events":
+        epi = EventSI(CSRGraph(faculty_graph), p=0.1, is_random_jump=True)
+    elif engine == "networkx":
+        epi = SI(faculty_graph, p=0.1, is_random_jump=True, profile=profile)
+    elif engine not in ("parallel", "adaptive"):
+        raise ValueError("Unknown engine {0!r}.".format(engine))
+
+    # Every run draws from its own stream, keyed by the seed and by what
+    # it simulates (see epidemic.rng)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    max_trials = si_trials; first_trial = 0
+    if store is not None:
+        # Trials already in the store count towards si_trials, so an
+        # interrupted sweep picks up after its last completed shard
+        first_trial = store.n_trials(pjumps, school_metadata.keys())
+        si_trials = max(0, si_trials - first_trial)
+        graph_hash = CSRGraph(faculty_graph).content_hash()
+    if engine == "parallel":
+        sweep_results = run_sweep(faculty_graph, school_metadata.keys(), pjumps, si_trials,
+                                  param="random_jump_p", processes=processes, seed=seed,
+                                  name="random_jump/BUSI_SI", profile=profile,
+                                  p=0.1, is_random_jump=True)
+        if store is not None:
+            store.append(sweep_results, seed=seed, graph_hash=graph_hash)
+    elif engine == "adaptive":
+        # Run each (jump probability, node) pair until its mean size is known to within
+        # target_se, with max_trials trials at most
+        prior = store.load() if store is not None else None
+        sweep_results, intervals = run_adaptive_sweep(faculty_graph, school_metadata.keys(), pjumps, target_se,
+                                                     max_trials, param="random_jump_p",
+                                                     processes=processes, seed=seed,
+                                                     name="random_jump/BUSI_SI", prior=prior, profile=profile,
+                                                     p=0.1, is_random_jump=True)
+        if store is not None:
+            store.append(sweep_results, seed=seed, graph_hash=graph_hash)
+        # cache/random_jump only exists once a random-jump store has been written
+        os.makedirs("cache/random_jump", exist_ok=True)
+        with open("cache/random_jump/BUSI_SI_intervals.json", "w") as outfile:
+            json.dump(intervals, outfile, indent=4)
+    else:
+        for trial in range(si_trials):
+            print("Trial progress: {}".format(trial / float(si_trials)))
+            trial_results = empty_results(pjumps)
+            for p in pjumps:
+                print("Jump probability: {0}".format(p))
+                for node in school_metadata.keys():
+                    epi.reset(random_jump_p=p,
+                              rng=stream(seed, "random_jump/BUSI_SI", p, node, first_trial + trial))
+                    epi.infect_node(node)
+                    epi.simulate()
+                    trial_results["size"][p][node].append(epi.size)
+                    trial_results["length"][p][node].append(epi.length)
+            if store is not None:
+                store.append(trial_results, seed=seed, graph_hash=graph_hash)
     print("SI + RANDOM HOP done")
 
 